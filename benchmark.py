@@ -0,0 +1,311 @@
+"""
+Retail Sales Analysis - Benchmark Suite
+=======================================
+Synthetic data generator and per-stage timings for the analysis pipeline
+
+Generates realistic sales CSVs with the columns `salesanalysis.main()`
+expects, runs every pipeline stage against them at several sizes and saves
+the timings as JSON so runs from different versions can be compared.
+
+Usage:
+    python benchmark.py                          # 50k, 1M, 10M, 100M rows
+    python benchmark.py --sizes 50000 1000000    # custom sizes
+    python benchmark.py --compare benchmarks/results/previous.json
+    python benchmark.py --backends pandas polars duckdb   # cube parity + timings
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import salesanalysis as sa
+
+
+DEFAULT_SIZES = [50_000, 1_000_000, 10_000_000, 100_000_000]
+
+# ============================================================================
+# 1. SYNTHETIC DATA GENERATOR
+# ============================================================================
+
+# Product catalog: name -> (category, base unit price)
+PRODUCTS = {
+    'Laptop': ('Computers', 1200.0),
+    'Desktop PC': ('Computers', 950.0),
+    'Tablet': ('Computers', 450.0),
+    'Monitor': ('Computers', 280.0),
+    'Smartphone': ('Mobile', 800.0),
+    'Smartwatch': ('Mobile', 300.0),
+    'Phone Case': ('Mobile', 25.0),
+    'Power Bank': ('Mobile', 45.0),
+    'Headphones': ('Audio', 150.0),
+    'Bluetooth Speaker': ('Audio', 120.0),
+    'Earbuds': ('Audio', 90.0),
+    'Soundbar': ('Audio', 350.0),
+    'Keyboard': ('Accessories', 60.0),
+    'Mouse': ('Accessories', 30.0),
+    'USB Cable': ('Accessories', 12.0),
+    'Webcam': ('Accessories', 75.0),
+    'Printer': ('Office', 220.0),
+    'Router': ('Office', 110.0),
+    'External SSD': ('Storage', 140.0),
+    'Memory Card': ('Storage', 35.0),
+}
+REGIONS = ['North America', 'Europe', 'Asia Pacific', 'Latin America', 'Middle East & Africa']
+SEGMENTS = ['Individual', 'Small Business', 'Enterprise']
+CHANNELS = ['Online', 'In-Store', 'Partner']
+
+# Relative order volume per calendar month (Q4 holiday peak, Q1 dip)
+MONTH_WEIGHTS = np.array([0.75, 0.7, 0.85, 0.9, 0.95, 1.0,
+                          1.0, 1.0, 0.95, 1.05, 1.35, 1.6])
+
+
+def generate_sales_data(n_rows, start_id=0, seed=42,
+                        start_date='2024-01-01', end_date='2025-12-31'):
+    """Generate `n_rows` synthetic orders with the sales table's columns"""
+    rng = np.random.default_rng([seed, start_id])
+    
+    # Dates weighted by month so seasonality shows up in the report
+    dates = pd.date_range(start_date, end_date, freq='D')
+    date_weights = MONTH_WEIGHTS[dates.month - 1]
+    date_idx = rng.choice(len(dates), size=n_rows, p=date_weights / date_weights.sum())
+    
+    # Cheap products sell more often and in larger quantities
+    names = np.array(list(PRODUCTS))
+    categories = np.array([PRODUCTS[name][0] for name in names])
+    base_prices = np.array([PRODUCTS[name][1] for name in names])
+    popularity = 1 / np.sqrt(base_prices)
+    product_idx = rng.choice(len(names), size=n_rows, p=popularity / popularity.sum())
+    
+    unit_price = np.round(base_prices[product_idx] * rng.uniform(0.9, 1.1, n_rows), 2)
+    quantity = rng.integers(1, 6, n_rows) + (base_prices[product_idx] < 100) * rng.integers(0, 4, n_rows)
+    
+    return pd.DataFrame({
+        'Order_ID': pd.Series(np.arange(start_id, start_id + n_rows) + 1).astype(str).str.zfill(9).radd('ORD'),
+        'Date': dates[date_idx].strftime(sa.DATE_FORMAT),
+        'Product': names[product_idx],
+        'Category': categories[product_idx],
+        'Region': rng.choice(REGIONS, n_rows),
+        'Quantity': quantity,
+        'Unit_Price': unit_price,
+        'Revenue': np.round(quantity * unit_price, 2),
+        'Customer_Segment': rng.choice(SEGMENTS, n_rows, p=[0.45, 0.35, 0.2]),
+        'Sales_Channel': rng.choice(CHANNELS, n_rows),
+    })
+
+
+def write_sales_csv(path, n_rows, chunk_rows=1_000_000, seed=42):
+    """Write a synthetic CSV in chunks so any size can be generated in bounded memory"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    for start in range(0, n_rows, chunk_rows):
+        chunk = generate_sales_data(min(chunk_rows, n_rows - start), start_id=start, seed=seed)
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+# ============================================================================
+# 2. STAGE TIMINGS
+# ============================================================================
+
+def timed(timings, stage, fn, *args, **kwargs):
+    """Run one pipeline stage and record its wall time in seconds"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[stage] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def benchmark_pipeline(data_path, work_dir, stream=False):
+    """Time each pipeline stage once against `data_path`"""
+    viz_path = os.path.join(work_dir, 'visualizations')
+    output_path = os.path.join(work_dir, 'outputs')
+    os.makedirs(viz_path, exist_ok=True)
+    os.makedirs(output_path, exist_ok=True)
+    
+    timings = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if stream:
+            cube, df = timed(timings, 'load', sa.stream_and_inspect_data, data_path)
+        else:
+            df = timed(timings, 'load', sa.load_and_inspect_data, data_path)
+            cube = timed(timings, 'cube', sa.build_sales_cube, df)
+        kpis = timed(timings, 'kpis', sa.calculate_kpis, cube)
+        product_revenue = timed(timings, 'products', sa.analyze_top_products, cube, viz_path)
+        regional_metrics = timed(timings, 'regions', sa.analyze_regions, cube, viz_path)
+        _, seasonal_pattern = timed(timings, 'seasonality', sa.analyze_seasonality, cube, viz_path)
+        timed(timings, 'rolling', sa.analyze_rolling_growth, cube)
+        timed(timings, 'insights', sa.additional_insights, df, cube, viz_path)
+        forecast = timed(timings, 'forecast', sa.forecast_revenue, cube)
+        recommendations = timed(timings, 'recommendations', sa.generate_recommendations,
+                                cube, kpis, product_revenue, regional_metrics, seasonal_pattern,
+                                forecast)
+        timed(timings, 'pdf', sa.create_summary_pdf, kpis, product_revenue, regional_metrics,
+              seasonal_pattern, recommendations, output_path, viz_path, forecast)
+    
+    timings['total'] = round(sum(timings.values()), 4)
+    return timings
+
+
+def backend_parity(data_path, backends, rtol=1e-6):
+    """Time the cube on each backend and check its table and dtypes against the pandas cube"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        df = sa.load_and_inspect_data(data_path)
+    
+    timings, mismatches = {}, []
+    sa.use_backend('pandas')
+    reference = timed(timings, 'cube[pandas]', sa.aggregate_rows, df)
+    for backend in backends:
+        if backend == 'pandas':
+            continue
+        sa.use_backend(backend)
+        cube = timed(timings, f'cube[{backend}]', sa.aggregate_rows, df)
+        try:
+            pd.testing.assert_frame_equal(reference, cube, check_exact=False, rtol=rtol)
+        except AssertionError as error:
+            mismatches.append((backend, str(error).strip().splitlines()[0]))
+    sa.use_backend('pandas')
+    return timings, mismatches
+
+
+def environment_info():
+    """Versions and host details stored alongside the timings"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+# ============================================================================
+# 3. REGRESSION COMPARISON
+# ============================================================================
+
+def compare_results(current, baseline, threshold=0.10):
+    """Print stage-by-stage ratios against a previous run; return the regressions"""
+    print("\n" + "="*70)
+    print("COMPARISON WITH BASELINE")
+    print("="*70)
+    
+    regressions = []
+    for size, timings in current['runs'].items():
+        previous = baseline['runs'].get(size)
+        if previous is None:
+            continue
+        print(f"\n📏 {int(size):,} rows")
+        for stage, seconds in timings.items():
+            before = previous.get(stage)
+            if not before:
+                continue
+            ratio = seconds / before
+            flag = '⚠️ ' if ratio > 1 + threshold else '  '
+            print(f"   {flag}{stage:<16} {before:>10.3f}s → {seconds:>10.3f}s  ({ratio:.2f}×)")
+            if ratio > 1 + threshold:
+                regressions.append((size, stage, ratio))
+    return regressions
+
+
+# ============================================================================
+# MAIN EXECUTION
+# ============================================================================
+
+def main(argv=None):
+    """Generate datasets, time every stage and save the results"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    parser = argparse.ArgumentParser(description="Benchmark the retail sales analysis pipeline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="row counts to benchmark (default: 50k 1M 10M 100M)")
+    parser.add_argument('--data-dir', default=os.path.join(script_dir, 'benchmarks', 'data'),
+                        help="where generated CSVs are kept and reused")
+    parser.add_argument('--output', help="results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--stream', action='store_true', help="benchmark the streaming loader")
+    parser.add_argument('--compare', help="previous results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="slowdown ratio above which a stage counts as a regression (default: 0.10)")
+    parser.add_argument('--backends', nargs='+', choices=['pandas'] + list(sa.AGGREGATION_BACKENDS),
+                        help="also time the cube on these backends and check each against pandas")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    
+    sa.setup_plotting()
+    sa.plt.switch_backend('Agg')
+    
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'mode': 'stream' if args.stream else 'in-memory',
+        'environment': environment_info(),
+        'runs': {},
+    }
+    mismatches = []
+    
+    for n_rows in args.sizes:
+        data_path = os.path.join(args.data_dir, f'sales_{n_rows}.csv')
+        if not os.path.exists(data_path):
+            print(f"\n🏭 Generating {n_rows:,} rows → {data_path}")
+            start = time.perf_counter()
+            write_sales_csv(data_path, n_rows, seed=args.seed)
+            print(f"   ✓ Generated in {time.perf_counter() - start:.1f}s")
+    
+        print(f"\n⏱️  Benchmarking {n_rows:,} rows...")
+        with tempfile.TemporaryDirectory() as work_dir:
+            timings = benchmark_pipeline(data_path, work_dir, stream=args.stream)
+        results['runs'][str(n_rows)] = timings
+        for stage, seconds in timings.items():
+            print(f"   {stage:<16} {seconds:>10.3f}s")
+        
+        if args.backends:
+            backend_timings, backend_mismatches = backend_parity(data_path, args.backends)
+            results.setdefault('backends', {})[str(n_rows)] = backend_timings
+            for stage, seconds in backend_timings.items():
+                print(f"   {stage:<16} {seconds:>10.3f}s")
+            for backend, detail in backend_mismatches:
+                print(f"   ❌ {backend} cube differs from pandas: {detail}")
+            mismatches += [(n_rows, backend) for backend, _ in backend_mismatches]
+    
+    output = args.output or os.path.join(
+        script_dir, 'benchmarks', 'results',
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Results saved: {output}")
+    
+    if mismatches:
+        print(f"\n❌ {len(mismatches)} backend cube(s) differ from the pandas cube")
+        return 1
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} stage(s) slower than baseline by more than "
+                  f"{args.threshold:.0%}")
+            return 1
+        print("\n✓ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
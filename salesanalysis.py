@@ -10,30 +10,257 @@ Project: Syntecxhub Internship - Sales Analytics
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime
+import argparse
+import contextlib
+import functools
+import glob
+import hashlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
 import warnings
 warnings.filterwarnings('ignore')
 
-# Set visualization style
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (12, 6)
-plt.rcParams['font.size'] = 10
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# matplotlib and seaborn are imported on first use (see setup_plotting) so
+# metrics-only runs never pay for them
+plt = None
+LogNorm = None
+
+# Row-level scatters switch to a pre-binned density grid above this many
+# points, keeping render time bounded whatever the dataset size
+SCATTER_POINT_BUDGET = 20_000
+DENSITY_GRID_BINS = 150
+
+
+# Output settings per render profile. 'publication' is the report's original
+# look; 'preview' renders on Agg at screen resolution with a fixed subplot
+# layout, skipping the tight_layout and tight-bbox layout passes. Stages run on
+# pipeline threads, so run_pipeline puts every profile on Agg in-process.
+RENDER_PROFILES = {
+    'publication': {'backend': None, 'dpi': 300, 'bbox_inches': 'tight', 'layout': None},
+    'preview': {'backend': 'Agg', 'dpi': 72, 'bbox_inches': None,
+                'layout': {'left': 0.07, 'right': 0.97, 'bottom': 0.12, 'top': 0.95,
+                           'wspace': 0.3, 'hspace': 0.5}},
+}
+render_profile = 'publication'
+
+# Figures are built once per process and cleared for each chart that reuses
+# them, so batch runs skip figure construction and styling after the first
+_figure_templates = {}
+
+
+def use_render_profile(name):
+    """Select the render profile (also used as a pool initializer)"""
+    global render_profile
+    render_profile = name
+
+
+def setup_plotting():
+    """Import matplotlib/seaborn on first use and apply the report style"""
+    global plt, LogNorm
+    if plt is None:
+        if RENDER_PROFILES[render_profile]['backend']:
+            import matplotlib
+            matplotlib.use(RENDER_PROFILES[render_profile]['backend'])
+        import matplotlib.pyplot as pyplot
+        from matplotlib.colors import LogNorm
+        import seaborn as sns
+        
+        # Set visualization style
+        sns.set_style("whitegrid")
+        pyplot.rcParams['figure.figsize'] = (12, 6)
+        pyplot.rcParams['font.size'] = 10
+        plt = pyplot
+    return plt
+
+
+def use_headless_backend():
+    """Switch pyplot to Agg before figures are drawn off the main thread
+    
+    GUI backends (macOS, Tk) must only be driven from the main thread; charts
+    are only ever saved to files, so Agg produces the same output.
+    """
+    import matplotlib
+    if plt is None:
+        matplotlib.use('Agg')
+    elif matplotlib.get_backend().lower() != 'agg':
+        plt.close('all')
+        _figure_templates.clear()
+        plt.switch_backend('Agg')
+
+
+def figure_template(name, nrows=2, ncols=2, figsize=(16, 12)):
+    """Figure and axes for one chart, built on first use and cleared on reuse"""
+    setup_plotting()
+    if name not in _figure_templates:
+        _figure_templates[name] = plt.subplots(nrows, ncols, figsize=figsize)
+    fig, axes = _figure_templates[name]
+    for ax in axes.flat:
+        ax.clear()
+    # Layout passes start from the subplot positions, so restore the defaults
+    fig.subplots_adjust(**{key: plt.rcParams[f'figure.subplot.{key}']
+                           for key in ('left', 'right', 'bottom', 'top', 'wspace', 'hspace')})
+    return fig, axes
+
+
+def staging_path(path):
+    """Hidden temporary name next to `path`, unique to this process and thread"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f'.{name}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+
+@contextlib.contextmanager
+def atomic_output(path):
+    """Write to a temporary file and rename it over `path`, so readers never see a partial file"""
+    tmp_path = staging_path(path)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_figure(fig, viz_path, filename):
+    """Lay out and save a chart with the active render profile"""
+    profile = RENDER_PROFILES[render_profile]
+    if profile['layout']:
+        fig.subplots_adjust(**profile['layout'])
+    else:
+        fig.tight_layout()
+    with atomic_output(f'{viz_path}/{filename}') as tmp_path:
+        fig.savefig(tmp_path, format=os.path.splitext(filename)[1][1:], dpi=profile['dpi'],
+                    bbox_inches=profile['bbox_inches'])
+    print(f"\n✓ Visualization saved: {filename}")
+
+
+def _grid_edges(values, bins):
+    """Bin edges for one axis; integer-valued data gets one bin per integer when it fits"""
+    low, high = np.nanmin(values), np.nanmax(values)
+    if np.all(np.mod(values, 1) == 0) and high - low < bins:
+        return np.arange(low - 0.5, high + 1.5)
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def density_grid(x, y, weights=None, bins=DENSITY_GRID_BINS):
+    """Pre-bin points into a 2D grid of counts (and mean weight per cell, if given)"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(x) & np.isfinite(y)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        keep &= np.isfinite(weights)
+        weights = weights[keep]
+    x, y = x[keep], y[keep]
+    
+    edges = [_grid_edges(x, bins), _grid_edges(y, bins)]
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=edges)
+    grid = {'x_edges': x_edges, 'y_edges': y_edges, 'counts': counts}
+    if weights is not None:
+        sums, _, _ = np.histogram2d(x, y, bins=edges, weights=weights)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            grid['mean'] = np.where(counts > 0, sums / counts, np.nan)
+    return grid
+
+
+_render_lock = threading.Lock()
+
+
+def render_inline(plot_fn, *args):
+    """Render a figure in the current process, one at a time across threads"""
+    with _render_lock:
+        plot_fn(*args)
+
+
+def submit_render(pool, futures, plot_fn, *args):
+    """Render a figure in a worker process (matplotlib is not thread-safe)"""
+    futures.append(pool.submit(plot_fn, *args))
+
+
+def skip_render(plot_fn, *args):
+    """Compute-only runs: drop the figure"""
+
 
 # ============================================================================
 # 1. DATA LOADING & INITIAL INSPECTION
 # ============================================================================
 
-def load_and_inspect_data(filepath):
-    """Load sales data and perform initial inspection"""
+# Explicit schema for the sales table. Low-cardinality dimensions are stored
+# as categoricals, Quantity is downcast to the smallest integer type that
+# holds it (sums are taken in int64), and Date is parsed with a fixed format
+# instead of per-row inference. Unit_Price and Revenue stay float64: float32
+# prices would add rounding noise to the revenue check, and a Quantity with
+# missing values stays float64 rather than float32 so unit totals stay exact.
+CATEGORICAL_COLUMNS = ['Product', 'Category', 'Region', 'Customer_Segment', 'Sales_Channel']
+DOWNCAST_COLUMNS = {'Quantity': 'integer'}
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_dates(values):
+    """Parse the Date column with the fixed format, falling back to inference"""
+    try:
+        return pd.to_datetime(values, format=DATE_FORMAT)
+    except (ValueError, TypeError):
+        return pd.to_datetime(values)
+
+
+def apply_sales_schema(df):
+    """Encode dimensions as categoricals, downcast numerics and parse dates"""
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    for column, kind in DOWNCAST_COLUMNS.items():
+        # Integers with missing values cannot be held in an int type; they are
+        # left as parsed (float64)
+        if column in df.columns and not df[column].isnull().any():
+            df[column] = pd.to_numeric(df[column], downcast=kind)
+    df['Date'] = parse_dates(df['Date'])
+    return df
+
+
+def load_and_inspect_data(filepath, cache_dir=None, validation_path=None):
+    """Load sales data and perform initial inspection
+    
+    With `cache_dir`, the parsed table is reused from the columnar cache when
+    the CSV is unchanged, and written there after a fresh parse otherwise.
+    Validation findings are written to `validation_path` when given.
+    """
     print("="*70)
     print("RETAIL SALES ANALYSIS - BUSINESS INTELLIGENCE REPORT")
     print("="*70)
     
     # Load data
-    df = pd.read_csv(filepath)
-    df['Date'] = pd.to_datetime(df['Date'])
+    df = read_column_cache(filepath, cache_dir) if cache_dir else None
+    if df is not None:
+        print(f"\n⚡ Reusing parsed columns from cache: {cache_dir}")
+    else:
+        df = pd.read_csv(filepath)
+        memory_before = df.memory_usage(deep=True).sum()
+        df = apply_sales_schema(df)
+        memory_after = df.memory_usage(deep=True).sum()
+        print(f"\n🗜️  Typed schema applied: {memory_before / 1e6:,.1f} MB → "
+              f"{memory_after / 1e6:,.1f} MB in memory")
+        if cache_dir:
+            write_column_cache(df, filepath, cache_dir)
+            print(f"\n💾 Parsed columns cached in: {cache_dir}")
     
     print(f"\n📊 Dataset loaded successfully!")
     print(f"   Shape: {df.shape[0]:,} rows × {df.shape[1]} columns")
@@ -52,16 +279,117 @@ def load_and_inspect_data(filepath):
         print("\n✓ No missing values detected")
     
     print(f"\n✓ Data types: All columns properly formatted")
-    print(f"✓ Duplicates: {df.duplicated().sum()} records")
+    report_validation(fold_validation(new_validation_state(), df), validation_path)
     
     return df
 
 
+def new_stream_state():
+    """Empty running state for chunked ingestion"""
+    return {
+        'cube': None,
+        'sample': None,
+        'missing': None,
+        'rows': 0,
+        'columns': [],
+        'date_min': pd.NaT,
+        'date_max': pd.NaT,
+        'validation': new_validation_state(),
+    }
+
+
+def fold_chunk(state, chunk, rng, sample_size=50_000):
+    """Fold one parsed chunk into the running cube, quality stats and row sample"""
+    if chunk.empty:
+        return state
+    
+    # Running quality stats
+    state['rows'] += len(chunk)
+    state['columns'] = list(chunk.columns)
+    chunk_missing = chunk.isnull().sum()
+    state['missing'] = (chunk_missing if state['missing'] is None
+                        else state['missing'].add(chunk_missing, fill_value=0))
+    chunk_min, chunk_max = chunk['Date'].min(), chunk['Date'].max()
+    state['date_min'] = chunk_min if pd.isna(state['date_min']) else min(state['date_min'], chunk_min)
+    state['date_max'] = chunk_max if pd.isna(state['date_max']) else max(state['date_max'], chunk_max)
+    fold_validation(state['validation'], chunk)
+    
+    # Fold the chunk's partial aggregates into the running cube
+    partial = aggregate_rows(chunk)
+    state['cube'] = partial if state['cube'] is None else merge_cubes([state['cube'], partial])
+    
+    # Uniform sample: keep the rows with the smallest random keys seen so far;
+    # the batch dimensions ride along so segment reports can slice it
+    keyed = chunk[['Unit_Price', 'Quantity', 'Revenue'] + BATCH_DIMENSIONS].assign(
+        _key=rng.random(len(chunk)))
+    sample = keyed if state['sample'] is None else pd.concat([state['sample'], keyed],
+                                                             ignore_index=True)
+    state['sample'] = sample.nsmallest(sample_size, '_key')
+    
+    return state
+
+
+def report_stream_state(state, verb='streamed', validation_path=None):
+    """Print the inspection summary for state built from chunks"""
+    print(f"\n📊 Dataset {verb} successfully!")
+    print(f"   Shape: {state['rows']:,} rows × {len(state['columns'])} columns")
+    print(f"   Date Range: {state['date_min'].date()} to {state['date_max'].date()}")
+    
+    # Data quality check
+    print("\n" + "="*70)
+    print("DATA QUALITY CHECK")
+    print("="*70)
+    
+    missing = state['missing'].astype(int)
+    if missing.sum() > 0:
+        print("\n⚠️ Missing values found:")
+        print(missing[missing > 0])
+    else:
+        print("\n✓ No missing values detected")
+    
+    print(f"\n✓ Data types: All columns properly formatted")
+    report_validation(state['validation'], validation_path)
+    
+    print(f"\n🧊 Aggregation cube built: {state['rows']:,} rows → {len(state['cube']):,} cells")
+
+
+def sample_rows(state):
+    """Row sample from a stream state, without its sampling keys"""
+    return state['sample'].drop(columns='_key').reset_index(drop=True)
+
+
+def stream_and_inspect_data(filepath, chunksize=500_000, sample_size=50_000, seed=42,
+                            validation_path=None):
+    """Stream sales data in bounded chunks, building the cube and quality stats as it goes
+    
+    The rows are never all held at once: only the current chunk, the running
+    cube (bounded by distinct dimension combinations), a fixed-size uniform row
+    sample for the row-level scatter chart and the duplicate check's sorted
+    Order_ID hashes (8 bytes per distinct order, the one part that grows with
+    the file) are kept.
+    """
+    print("="*70)
+    print("RETAIL SALES ANALYSIS - BUSINESS INTELLIGENCE REPORT")
+    print("="*70)
+    
+    rng = np.random.default_rng(seed)
+    state = new_stream_state()
+    
+    for i, chunk in enumerate(pd.read_csv(filepath, chunksize=chunksize), 1):
+        fold_chunk(state, apply_sales_schema(chunk), rng, sample_size)
+        print(f"   ⏳ Chunk {i}: {state['rows']:,} rows processed, "
+              f"cube at {len(state['cube']):,} cells")
+    
+    report_stream_state(state, validation_path=validation_path)
+    
+    return state['cube'], sample_rows(state)
+
+
 # ============================================================================
 # 2. KEY PERFORMANCE INDICATORS (KPIs)
 # ============================================================================
 
-def calculate_kpis(df):
+def calculate_kpis(cube):
     """Calculate essential business KPIs"""
     print("\n" + "="*70)
     print("KEY PERFORMANCE INDICATORS (KPIs)")
@@ -70,31 +398,32 @@ def calculate_kpis(df):
     kpis = {}
     
     # Total Revenue
-    kpis['total_revenue'] = df['Revenue'].sum()
+    kpis['total_revenue'] = cube['Revenue'].sum()
     print(f"\n💰 Total Revenue: ${kpis['total_revenue']:,.2f}")
     
     # Total Orders
-    kpis['total_orders'] = len(df)
+    kpis['total_orders'] = int(cube['Row_Count'].sum())
     print(f"📦 Total Orders: {kpis['total_orders']:,}")
     
     # Average Order Value (AOV)
-    kpis['avg_order_value'] = df['Revenue'].mean()
+    kpis['avg_order_value'] = kpis['total_revenue'] / cube['Revenue_Count'].sum()
     print(f"💵 Average Order Value: ${kpis['avg_order_value']:,.2f}")
     
     # Total Units Sold
-    kpis['total_units'] = df['Quantity'].sum()
+    kpis['total_units'] = cube['Quantity'].sum()
     print(f"📊 Total Units Sold: {kpis['total_units']:,}")
     
     # Average Units per Order
-    kpis['avg_units_per_order'] = df['Quantity'].mean()
+    kpis['avg_units_per_order'] = kpis['total_units'] / cube['Quantity_Count'].sum()
     print(f"📈 Average Units per Order: {kpis['avg_units_per_order']:.2f}")
     
     # Number of Unique Products
-    kpis['unique_products'] = df['Product'].nunique()
+    # (approximate mode stores the full-column sketch estimate on the cube)
+    kpis['unique_products'] = cube.attrs.get('unique_products', cube['Product'].nunique())
     print(f"🏷️  Unique Products: {kpis['unique_products']}")
     
     # Average Unit Price
-    kpis['avg_unit_price'] = df['Unit_Price'].mean()
+    kpis['avg_unit_price'] = cube['Unit_Price'].sum() / cube['Unit_Price_Count'].sum()
     print(f"💲 Average Unit Price: ${kpis['avg_unit_price']:.2f}")
     
     # Revenue per Unit
@@ -108,29 +437,46 @@ def calculate_kpis(df):
 # 3. TOP PRODUCTS ANALYSIS
 # ============================================================================
 
-def analyze_top_products(df, viz_path, top_n=10):
+def analyze_top_products(cube, viz_path, top_n=10, render=render_inline):
     """Identify and visualize top-performing products"""
     print("\n" + "="*70)
     print("TOP PRODUCTS ANALYSIS")
     print("="*70)
     
     # Revenue by product
-    product_revenue = df.groupby('Product').agg({
-        'Revenue': 'sum',
-        'Quantity': 'sum',
-        'Order_ID': 'count'
-    }).round(2)
+    product_metrics = rollup_cube(cube, 'Product')
+    product_revenue = product_metrics[['Revenue', 'Quantity', 'Order_Count']].round(2)
     product_revenue.columns = ['Total_Revenue', 'Units_Sold', 'Order_Count']
-    product_revenue = product_revenue.sort_values('Total_Revenue', ascending=False)
+    
+    # Partial selection: only the top rows are ever sorted
+    top_products = top_n_rows(product_revenue, 'Total_Revenue', top_n)
+    top_units = top_n_rows(product_revenue, 'Units_Sold', top_n)
     
     print(f"\n🏆 Top {top_n} Products by Revenue:")
-    print(product_revenue.head(top_n))
+    print(top_products)
+    
+    print(f"\n🌍 Top 3 Products per Region:")
+    print(top_n_per_group(cube, 'Region', 'Product', 'Revenue', 3))
+    
+    category_revenue = rollup_cube(cube, 'Category')['Revenue'].sort_values(ascending=False)
+    
+    # Large catalogs are plotted as a density grid rather than one marker per SKU
+    product_points = product_metrics[['Quantity', 'Revenue']]
+    if len(product_points) > SCATTER_POINT_BUDGET:
+        product_points = density_grid(product_points['Quantity'], product_points['Revenue'])
+    
+    render(plot_top_products, top_products, top_units, product_points, category_revenue,
+           viz_path, top_n)
     
+    return product_revenue
+
+
+def plot_top_products(top_products, top_units, product_points, category_revenue, viz_path, top_n):
+    """Render the 2x2 top products figure"""
     # Visualization
-    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig, axes = figure_template('top_products')
     
     # Top products by revenue
-    top_products = product_revenue.head(top_n)
     colors = plt.cm.viridis(np.linspace(0, 1, len(top_products)))
     
     axes[0, 0].barh(range(len(top_products)), top_products['Total_Revenue'], color=colors)
@@ -145,7 +491,6 @@ def analyze_top_products(df, viz_path, top_n=10):
         axes[0, 0].text(v, i, f' ${v:,.0f}', va='center', fontweight='bold')
     
     # Top products by units sold
-    top_units = product_revenue.sort_values('Units_Sold', ascending=False).head(top_n)
     axes[0, 1].barh(range(len(top_units)), top_units['Units_Sold'], color='coral')
     axes[0, 1].set_yticks(range(len(top_units)))
     axes[0, 1].set_yticklabels(top_units.index)
@@ -154,47 +499,40 @@ def analyze_top_products(df, viz_path, top_n=10):
     axes[0, 1].invert_yaxis()
     
     # Category performance
-    category_revenue = df.groupby('Category')['Revenue'].sum().sort_values(ascending=False)
     axes[1, 0].pie(category_revenue.values, labels=category_revenue.index, autopct='%1.1f%%',
                    startangle=90, colors=plt.cm.Set3.colors)
     axes[1, 0].set_title('Revenue Distribution by Category', fontweight='bold', fontsize=12)
     
     # Product performance scatter
-    product_metrics = df.groupby('Product').agg({
-        'Revenue': 'sum',
-        'Quantity': 'sum'
-    })
-    axes[1, 1].scatter(product_metrics['Quantity'], product_metrics['Revenue'], 
-                      alpha=0.6, s=200, c='steelblue', edgecolors='black')
+    if isinstance(product_points, dict):
+        axes[1, 1].pcolormesh(product_points['x_edges'], product_points['y_edges'],
+                              np.ma.masked_equal(product_points['counts'].T, 0),
+                              cmap='Blues', norm=LogNorm())
+    else:
+        axes[1, 1].scatter(product_points['Quantity'], product_points['Revenue'], 
+                          alpha=0.6, s=200, c='steelblue', edgecolors='black')
     axes[1, 1].set_xlabel('Total Units Sold', fontweight='bold')
     axes[1, 1].set_ylabel('Total Revenue ($)', fontweight='bold')
     axes[1, 1].set_title('Product Performance: Revenue vs Units Sold', fontweight='bold', fontsize=12)
     axes[1, 1].grid(alpha=0.3)
     
-    plt.tight_layout()
-    plt.savefig(f'{viz_path}/top_products_analysis.png', dpi=300, bbox_inches='tight')
-    print(f"\n✓ Visualization saved: top_products_analysis.png")
-    plt.close()
-    
-    return product_revenue
+    save_figure(fig, viz_path, 'top_products_analysis.png')
 
 
 # ============================================================================
 # 4. REGIONAL ANALYSIS
 # ============================================================================
 
-def analyze_regions(df, viz_path):
+def analyze_regions(cube, viz_path, render=render_inline):
     """Analyze sales performance by region"""
     print("\n" + "="*70)
     print("REGIONAL PERFORMANCE ANALYSIS")
     print("="*70)
     
     # Regional metrics
-    regional_metrics = df.groupby('Region').agg({
-        'Revenue': 'sum',
-        'Order_ID': 'count',
-        'Quantity': 'sum'
-    }).round(2)
+    regional_metrics = rollup_cube(cube, 'Region')[
+        ['Revenue', 'Order_Count', 'Quantity']
+    ].round(2)
     regional_metrics.columns = ['Total_Revenue', 'Order_Count', 'Units_Sold']
     regional_metrics['Avg_Order_Value'] = (regional_metrics['Total_Revenue'] / 
                                             regional_metrics['Order_Count']).round(2)
@@ -208,8 +546,15 @@ def analyze_regions(df, viz_path):
         (regional_metrics['Total_Revenue'] / regional_metrics['Total_Revenue'].sum()) * 100
     ).round(2)
     
+    render(plot_regions, regional_metrics, viz_path)
+    
+    return regional_metrics
+
+
+def plot_regions(regional_metrics, viz_path):
+    """Render the 2x2 regional performance figure"""
     # Visualization
-    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig, axes = figure_template('regions')
     
     # Revenue by region
     colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8']
@@ -252,55 +597,59 @@ def analyze_regions(df, viz_path):
     ax2.legend(loc='upper left')
     ax2.grid(axis='y', alpha=0.3)
     
-    plt.tight_layout()
-    plt.savefig(f'{viz_path}/regional_analysis.png', dpi=300, bbox_inches='tight')
-    print(f"\n✓ Visualization saved: regional_analysis.png")
-    plt.close()
-    
-    return regional_metrics
+    save_figure(fig, viz_path, 'regional_analysis.png')
 
 
 # ============================================================================
 # 5. SEASONALITY & TRENDS ANALYSIS
 # ============================================================================
 
-def analyze_seasonality(df, viz_path):
+def analyze_seasonality(cube, viz_path, render=render_inline):
     """Analyze sales trends and seasonality patterns"""
     print("\n" + "="*70)
     print("SEASONALITY & TRENDS ANALYSIS")
     print("="*70)
     
-    # Time-based aggregations
-    df['Year'] = df['Date'].dt.year
-    df['Quarter'] = df['Date'].dt.quarter
-    df['Month_Num'] = df['Date'].dt.month
-    df['Month_Name'] = df['Date'].dt.strftime('%B')
-    df['Week'] = df['Date'].dt.isocalendar().week
+    # Every calendar view is derived from the daily rollup (one row per date)
+    daily = build_daily_rollup(cube)
     
     # Monthly trends
-    monthly_revenue = df.groupby(['Year', 'Month_Num', 'Month_Name']).agg({
-        'Revenue': 'sum',
-        'Order_ID': 'count'
-    }).reset_index()
-    monthly_revenue = monthly_revenue.sort_values(['Year', 'Month_Num'])
+    monthly_revenue = monthly_view(daily)
     
     print(f"\n📅 Monthly Revenue Trends (Last 12 Months):")
     print(monthly_revenue.tail(12)[['Year', 'Month_Name', 'Revenue', 'Order_ID']])
     
     # Quarterly performance
-    quarterly_revenue = df.groupby(['Year', 'Quarter']).agg({
-        'Revenue': 'sum',
-        'Order_ID': 'count'
-    }).reset_index()
+    quarterly_revenue = quarterly_view(daily)
     
     print(f"\n📊 Quarterly Performance:")
     print(quarterly_revenue)
     
+    # Weekly performance
+    weekly_revenue = weekly_view(daily)
+    
+    print(f"\n🗓️  Weekly Performance (Last 8 ISO Weeks):")
+    print(weekly_revenue.tail(8).round(2))
+    
+    # Month labels for the trend line
+    monthly_revenue['YearMonth'] = monthly_revenue['Year'].astype(str) + '-' + monthly_revenue['Month_Num'].astype(str).str.zfill(2)
+    
+    # Seasonality pattern and daily orders
+    seasonal_pattern = month_of_year_view(daily)
+    daily_orders = daily.set_index('Date')['Order_Count']
+    
+    render(plot_seasonality, monthly_revenue, seasonal_pattern, quarterly_revenue,
+           daily_orders, viz_path)
+    
+    return monthly_revenue, seasonal_pattern
+
+
+def plot_seasonality(monthly_revenue, seasonal_pattern, quarterly_revenue, daily_orders, viz_path):
+    """Render the 2x2 seasonality and trends figure"""
     # Visualization
-    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig, axes = figure_template('seasonality')
     
     # Monthly revenue trend
-    monthly_revenue['YearMonth'] = monthly_revenue['Year'].astype(str) + '-' + monthly_revenue['Month_Num'].astype(str).str.zfill(2)
     axes[0, 0].plot(range(len(monthly_revenue)), monthly_revenue['Revenue'], 
                     marker='o', linewidth=2, color='steelblue', markersize=6)
     axes[0, 0].set_title('Monthly Revenue Trend', fontweight='bold', fontsize=12)
@@ -310,11 +659,6 @@ def analyze_seasonality(df, viz_path):
     axes[0, 0].tick_params(axis='x', rotation=45)
     
     # Seasonality by month
-    seasonal_pattern = df.groupby('Month_Name')['Revenue'].mean().reindex([
-        'January', 'February', 'March', 'April', 'May', 'June',
-        'July', 'August', 'September', 'October', 'November', 'December'
-    ])
-    
     colors_seasonal = plt.cm.coolwarm(seasonal_pattern / seasonal_pattern.max())
     axes[0, 1].bar(range(12), seasonal_pattern.values, color=colors_seasonal)
     axes[0, 1].set_title('Average Revenue by Month (Seasonality Pattern)', 
@@ -337,52 +681,61 @@ def analyze_seasonality(df, viz_path):
     axes[1, 0].grid(axis='y', alpha=0.3)
     
     # Daily orders trend
-    daily_orders = df.groupby('Date')['Order_ID'].count()
     axes[1, 1].plot(daily_orders.index, daily_orders.values, alpha=0.6, color='coral')
     axes[1, 1].set_title('Daily Order Volume', fontweight='bold', fontsize=12)
     axes[1, 1].set_xlabel('Date', fontweight='bold')
     axes[1, 1].set_ylabel('Number of Orders', fontweight='bold')
     axes[1, 1].grid(alpha=0.3)
     
-    plt.tight_layout()
-    plt.savefig(f'{viz_path}/seasonality_trends.png', dpi=300, bbox_inches='tight')
-    print(f"\n✓ Visualization saved: seasonality_trends.png")
-    plt.close()
-    
-    return monthly_revenue, seasonal_pattern
+    save_figure(fig, viz_path, 'seasonality_trends.png')
 
 
 # ============================================================================
 # 6. ADDITIONAL INSIGHTS
 # ============================================================================
 
-def additional_insights(df, viz_path):
-    """Generate additional business insights"""
+def additional_insights(df, cube, viz_path, render=render_inline):
+    """Generate additional business insights
+    
+    `df` only feeds the row-level price/quantity scatter, so a row sample
+    (as produced by streaming mode) is enough.
+    """
     print("\n" + "="*70)
     print("ADDITIONAL BUSINESS INSIGHTS")
     print("="*70)
     
     # Customer segment analysis
-    segment_revenue = df.groupby('Customer_Segment')['Revenue'].sum().sort_values(ascending=False)
+    segment_revenue = rollup_cube(cube, 'Customer_Segment')['Revenue'].sort_values(ascending=False)
     print(f"\n👥 Revenue by Customer Segment:")
     print(segment_revenue)
     
     # Sales channel analysis
-    channel_revenue = df.groupby('Sales_Channel')['Revenue'].sum().sort_values(ascending=False)
+    channel_revenue = rollup_cube(cube, 'Sales_Channel')['Revenue'].sort_values(ascending=False)
     print(f"\n🛒 Revenue by Sales Channel:")
     print(channel_revenue)
     
     # Category performance
-    category_metrics = df.groupby('Category').agg({
-        'Revenue': 'sum',
-        'Order_ID': 'count',
-        'Quantity': 'sum'
-    }).sort_values('Revenue', ascending=False)
+    category_metrics = rollup_cube(cube, 'Category')[['Revenue', 'Order_Count', 'Quantity']]
+    category_metrics = category_metrics.rename(columns={'Order_Count': 'Order_ID'})
+    category_metrics = category_metrics.sort_values('Revenue', ascending=False)
     print(f"\n📦 Category Performance:")
     print(category_metrics)
     
+    if df is not None:
+        # Beyond the point budget, pre-bin rows into a grid of mean revenue per cell
+        points = df[['Unit_Price', 'Quantity', 'Revenue']]
+        if len(points) > SCATTER_POINT_BUDGET:
+            points = density_grid(points['Unit_Price'], points['Quantity'], points['Revenue'])
+        render(plot_additional_insights, segment_revenue, channel_revenue, category_metrics,
+               points, viz_path)
+    
+    return segment_revenue, channel_revenue, category_metrics
+
+
+def plot_additional_insights(segment_revenue, channel_revenue, category_metrics, points, viz_path):
+    """Render the 2x2 additional insights figure"""
     # Visualization
-    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig, axes = figure_template('additional_insights')
     
     # Customer segment
     segment_revenue.plot(kind='bar', ax=axes[0, 0], color=['#FFD700', '#C0C0C0', '#CD7F32'])
@@ -403,27 +756,26 @@ def additional_insights(df, viz_path):
     axes[1, 0].grid(axis='x', alpha=0.3)
     
     # Price vs Quantity relationship
-    axes[1, 1].scatter(df['Unit_Price'], df['Quantity'], alpha=0.3, c=df['Revenue'], 
-                      cmap='viridis', s=50)
+    if isinstance(points, dict):
+        axes[1, 1].pcolormesh(points['x_edges'], points['y_edges'], np.ma.masked_invalid(points['mean'].T),
+                              cmap='viridis')
+    else:
+        axes[1, 1].scatter(points['Unit_Price'], points['Quantity'], alpha=0.3, c=points['Revenue'], 
+                          cmap='viridis', s=50)
     axes[1, 1].set_xlabel('Unit Price ($)', fontweight='bold')
     axes[1, 1].set_ylabel('Quantity', fontweight='bold')
     axes[1, 1].set_title('Price vs Quantity Relationship', fontweight='bold', fontsize=12)
     axes[1, 1].grid(alpha=0.3)
     
-    plt.tight_layout()
-    plt.savefig(f'{viz_path}/additional_insights.png', dpi=300, bbox_inches='tight')
-    print(f"\n✓ Visualization saved: additional_insights.png")
-    plt.close()
-    
-    return segment_revenue, channel_revenue, category_metrics
+    save_figure(fig, viz_path, 'additional_insights.png')
 
 
 # ============================================================================
 # 7. BUSINESS RECOMMENDATIONS
 # ============================================================================
 
-def generate_recommendations(df, kpis, product_revenue, regional_metrics, 
-                            seasonal_pattern):
+def generate_recommendations(cube, kpis, product_revenue, regional_metrics, 
+                            seasonal_pattern, forecast=None):
     """Generate data-driven business recommendations"""
     print("\n" + "="*70)
     print("BUSINESS RECOMMENDATIONS")
@@ -432,8 +784,9 @@ def generate_recommendations(df, kpis, product_revenue, regional_metrics,
     recommendations = []
     
     # Top product recommendation
-    top_product = product_revenue.index[0]
-    top_product_revenue = product_revenue.iloc[0]['Total_Revenue']
+    best = top_n_rows(product_revenue, 'Total_Revenue', 1)
+    top_product = best.index[0]
+    top_product_revenue = best.iloc[0]['Total_Revenue']
     recommendations.append(
         f"1. PRODUCT STRATEGY: {top_product} is the top revenue generator "
         f"(${top_product_revenue:,.2f}). Consider expanding inventory and creating "
@@ -473,6 +826,20 @@ def generate_recommendations(df, kpis, product_revenue, regional_metrics,
         f"and lifetime value."
     )
     
+    # Forward-looking demand
+    if forecast is not None:
+        monthly = forecast['monthly']
+        total, last_year = monthly['Forecast'].sum(), monthly['Last_Year'].sum()
+        versus = (f" ({(total / last_year - 1) * 100:+.1f}% vs the same months last year)"
+                  if last_year > 0 else "")
+        outlook = forecast_outlook(forecast)
+        focus = (f" {outlook[0]} in {outlook[1]} has the strongest outlook ({outlook[2]} vs "
+                 f"last year); secure stock and promotion capacity there first." if outlook else "")
+        recommendations.append(
+            f"6. DEMAND OUTLOOK: Revenue for {monthly.index[0]} to {monthly.index[-1]} is "
+            f"forecast at ${total:,.2f}{versus}.{focus}"
+        )
+    
     print("\n💡 Strategic Recommendations:\n")
     for rec in recommendations:
         print(f"{rec}\n")
@@ -485,7 +852,7 @@ def generate_recommendations(df, kpis, product_revenue, regional_metrics,
 # ============================================================================
 
 def create_summary_pdf(kpis, product_revenue, regional_metrics, seasonal_pattern, 
-                      recommendations, output_path, viz_path):
+                      recommendations, output_path, viz_path, forecast=None):
     """Create a one-page PDF summary with charts"""
     print("\n" + "="*70)
     print("GENERATING ONE-PAGE SUMMARY PDF")
@@ -499,7 +866,8 @@ def create_summary_pdf(kpis, product_revenue, regional_metrics, seasonal_pattern
     
     # Create PDF
     pdf_file = f'{output_path}/Sales_Analysis_Summary.pdf'
-    c = canvas.Canvas(pdf_file, pagesize=letter)
+    tmp_file = staging_path(pdf_file)
+    c = canvas.Canvas(tmp_file, pagesize=letter)
     width, height = letter
     
     # Title
@@ -534,7 +902,7 @@ def create_summary_pdf(kpis, product_revenue, regional_metrics, seasonal_pattern
     
     y_position -= 20
     c.setFont("Helvetica", 9)
-    top_5_products = product_revenue.head(5)
+    top_5_products = top_n_rows(product_revenue, 'Total_Revenue', 5)
     for idx, (product, row) in enumerate(top_5_products.iterrows(), 1):
         c.drawString(60, y_position, 
                     f"{idx}. {product}: ${row['Total_Revenue']:,.0f}")
@@ -552,6 +920,24 @@ def create_summary_pdf(kpis, product_revenue, regional_metrics, seasonal_pattern
                     f"{idx}. {region}: ${row['Total_Revenue']:,.0f} ({row['Market_Share_%']:.1f}%)")
         y_position -= 12
     
+    # Revenue forecast
+    if forecast is not None:
+        y_position -= 15
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(50, y_position, f"Revenue Forecast (Next {len(forecast['monthly'])} Months)")
+        
+        y_position -= 20
+        c.setFont("Helvetica", 9)
+        for month, row in forecast['monthly'].iterrows():
+            versus = f" ({row['Change_%']:+.1f}% vs last year)" if np.isfinite(row['Change_%']) else ""
+            c.drawString(60, y_position, f"{month}: ${row['Forecast']:,.0f}{versus}")
+            y_position -= 12
+        outlook = forecast_outlook(forecast)
+        if outlook:
+            c.drawString(60, y_position, f"Strongest outlook: {outlook[0]} in {outlook[1]} "
+                                         f"({outlook[2]} vs last year)")
+            y_position -= 12
+    
     # Recommendations
     y_position -= 15
     c.setFont("Helvetica-Bold", 12)
@@ -585,29 +971,2326 @@ def create_summary_pdf(kpis, product_revenue, regional_metrics, seasonal_pattern
     c.drawString(50, 30, "Retail Sales Analysis | Business Intelligence Report")
     c.drawString(width - 150, 30, "Syntecxhub Internship Project")
     
-    # Save PDF
+    # Save PDF, then move it into place in one step
     c.save()
+    os.replace(tmp_file, pdf_file)
     print(f"\n✓ PDF summary created: Sales_Analysis_Summary.pdf")
     
     return pdf_file
 
 
+# ============================================================================
+# 9. AGGREGATION CUBE
+# ============================================================================
+
+# Dimensions every analysis stage slices by, and the additive measures kept
+# for each combination of them. Sums and non-null counts are stored
+# separately so means (AOV, unit price, seasonal averages) can be rebuilt
+# exactly from any rollup.
+CUBE_DIMENSIONS = ['Product', 'Category', 'Region', 'Customer_Segment',
+                   'Sales_Channel', 'Date']
+CUBE_MEASURES = ['Revenue', 'Revenue_Count', 'Quantity', 'Quantity_Count',
+                 'Unit_Price', 'Unit_Price_Count', 'Order_Count', 'Row_Count']
+
+
+def aggregate_rows(df):
+    """Group raw rows into cube cells (sums and non-null counts per combination)"""
+    if aggregation_backend != 'pandas':
+        return AGGREGATION_BACKENDS[aggregation_backend](df)
+    # Downcast integers are summed in int64; groupby sums keep the input width
+    wide = {column: np.int64 for column in DOWNCAST_COLUMNS
+            if column in df.columns and pd.api.types.is_integer_dtype(df[column])}
+    return df.astype(wide).groupby(CUBE_DIMENSIONS, sort=False, observed=True, dropna=False).agg(
+        Revenue=('Revenue', 'sum'),
+        Revenue_Count=('Revenue', 'count'),
+        Quantity=('Quantity', 'sum'),
+        Quantity_Count=('Quantity', 'count'),
+        Unit_Price=('Unit_Price', 'sum'),
+        Unit_Price_Count=('Unit_Price', 'count'),
+        Order_Count=('Order_ID', 'count'),
+        Row_Count=('Revenue', 'size'),
+    ).reset_index()
+
+
+def merge_cubes(cubes):
+    """Combine partial cubes (e.g. one per chunk) into a single cube"""
+    return pd.concat(cubes, ignore_index=True).groupby(
+        CUBE_DIMENSIONS, sort=False, observed=True, dropna=False
+    )[CUBE_MEASURES].sum().reset_index()
+
+
+def build_sales_cube(df):
+    """Aggregate the raw rows once into sums and counts per dimension combination"""
+    cube = aggregate_rows(df)
+    
+    print(f"\n🧊 Aggregation cube built: {len(df):,} rows → {len(cube):,} cells")
+    
+    return cube
+
+
+def rollup_cube(cube, by):
+    """Roll the cube up to the given dimension(s) by summing its measures"""
+    return cube.groupby(by, sort=False, observed=True)[CUBE_MEASURES].sum()
+
+
+# ============================================================================
+# 10. COLUMNAR DATASET CACHE
+# ============================================================================
+
+# One directory per source file holding a .npy file per column plus a
+# meta.json manifest. Numeric and datetime columns are stored as-is,
+# categoricals as int32 codes plus their (small) categories array, and other
+# text columns such as the per-row Order_ID as UTF-8 bytes with a missing-value
+# mask, so every column can be memory-mapped on reload instead of re-parsing
+# the CSV. Each column's dtype is recorded and restored, so a reload gives the
+# same table as a fresh parse.
+CACHE_VERSION = 3
+
+
+def _decode_text(raw, missing, dtype):
+    """Text column from its cached UTF-8 bytes and missing-value mask"""
+    if importlib.util.find_spec('pyarrow') is not None:
+        import pyarrow as pa
+        values = pa.array(np.asarray(raw), mask=missing).cast(pa.string()).to_pandas()
+    else:
+        values = np.char.decode(np.asarray(raw), 'utf-8').astype(object)
+        values[missing] = None
+    return pd.Series(values).astype(dtype)
+
+
+def _file_digest(filepath, block_size=1 << 20):
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_table_dir(filepath, cache_dir):
+    """Cache directory for a given source file"""
+    return os.path.join(cache_dir, os.path.splitext(os.path.basename(filepath))[0])
+
+
+def read_column_cache(filepath, cache_dir):
+    """Memory-map the cached columns for `filepath`, or return None if missing or stale"""
+    table_dir = _cache_table_dir(filepath, cache_dir)
+    meta_path = os.path.join(table_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_VERSION:
+        return None
+    
+    # Size and mtime are checked first; a touched-but-identical file still
+    # hits the cache through the content hash (shared with the result cache)
+    stat = os.stat(filepath)
+    if stat.st_size != meta['size']:
+        return None
+    if stat.st_mtime_ns != meta['mtime_ns'] and file_digests([filepath], cache_dir)[0] != meta['sha256']:
+        return None
+    
+    columns = {}
+    for column in meta['columns']:
+        values = np.load(os.path.join(table_dir, column['file']), mmap_mode='r')
+        if column['kind'] == 'categorical':
+            categories = np.load(os.path.join(table_dir, column['categories']))
+            values = pd.Categorical.from_codes(
+                values, pd.Index(categories).astype(column['categories_dtype']))
+        elif column['kind'] == 'text':
+            missing = (np.load(os.path.join(table_dir, column['missing']))
+                       if 'missing' in column else np.zeros(len(values), dtype=bool))
+            values = _decode_text(values, missing, column['dtype'])
+        columns[column['name']] = values
+    
+    return pd.DataFrame(columns, copy=False)
+
+
+def write_column_cache(df, filepath, cache_dir):
+    """Write the parsed table as one .npy file per column, keyed by the source file"""
+    table_dir = _cache_table_dir(filepath, cache_dir)
+    os.makedirs(table_dir, exist_ok=True)
+    
+    # The manifest is written last, so a partially written cache never validates
+    meta_path = os.path.join(table_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        entry = {'name': name, 'file': f'col{i}.npy', 'dtype': str(series.dtype)}
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufM':
+            entry['kind'] = 'numeric'
+            np.save(os.path.join(table_dir, entry['file']), series.to_numpy())
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            entry['kind'] = 'categorical'
+            entry['categories'] = f'col{i}_categories.npy'
+            entry['categories_dtype'] = str(series.cat.categories.dtype)
+            np.save(os.path.join(table_dir, entry['file']), series.cat.codes.to_numpy(np.int32))
+            np.save(os.path.join(table_dir, entry['categories']),
+                    np.asarray(series.cat.categories, dtype=str))
+        else:
+            # Unique-per-row text would make a categories array as large as the column
+            entry['kind'] = 'text'
+            missing = series.isna().to_numpy()
+            np.save(os.path.join(table_dir, entry['file']),
+                    series.fillna('').astype(str).str.encode('utf-8').to_numpy().astype('S'))
+            if missing.any():
+                entry['missing'] = f'col{i}_missing.npy'
+                np.save(os.path.join(table_dir, entry['missing']), missing)
+        columns.append(entry)
+    
+    stat = os.stat(filepath)
+    meta = {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(filepath),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_digests([filepath], cache_dir)[0],
+        'rows': len(df),
+        'columns': columns,
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+# ============================================================================
+# 11. INCREMENTAL APPEND MODE
+# ============================================================================
+
+# The stream state (cube, row sample, quality stats) is persisted after each
+# run together with the byte offset read up to and a digest of the bytes just
+# before it. When the CSV has only been appended to, the next run parses just
+# the tail; if it was rewritten, restated or back-dated rows could be anywhere,
+# so the state is rebuilt from the full file.
+# Each source file gets its own state directory, and the manifest records the
+# source path so a same-named file elsewhere rebuilds instead of folding in.
+INCREMENTAL_VERSION = 2
+
+
+def _tail_digest(f, offset, window=1 << 16):
+    """SHA-256 of the `window` bytes preceding `offset` in an open binary file"""
+    start = max(0, offset - window)
+    f.seek(start)
+    return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+
+def read_incremental_state(state_dir, filepath):
+    """Load the persisted stream state of `filepath` and its manifest, or (None, None)"""
+    meta_path = os.path.join(state_dir, 'state.json')
+    if not os.path.exists(meta_path):
+        return None, None
+    
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version') != INCREMENTAL_VERSION:
+        return None, None
+    if meta.get('source') != os.path.abspath(filepath):
+        return None, None
+    
+    state = {
+        'cube': pd.read_pickle(os.path.join(state_dir, 'cube.pkl')),
+        'sample': pd.read_pickle(os.path.join(state_dir, 'sample.pkl')),
+        'missing': pd.Series(meta['missing'], dtype='int64'),
+        'rows': meta['rows'],
+        'columns': meta['columns'],
+        'date_min': pd.Timestamp(meta['date_min']),
+        'date_max': pd.Timestamp(meta['date_max']),
+        'validation': pd.read_pickle(os.path.join(state_dir, 'validation.pkl')),
+    }
+    return state, meta
+
+
+def write_incremental_state(state_dir, filepath, state, offset, tail_sha256):
+    """Persist the stream state; the manifest is replaced last so a crash leaves the old state"""
+    os.makedirs(state_dir, exist_ok=True)
+    for name in ('cube', 'sample', 'validation'):
+        tmp_path = os.path.join(state_dir, f'{name}.pkl.tmp')
+        pd.to_pickle(state[name], tmp_path)
+        os.replace(tmp_path, os.path.join(state_dir, f'{name}.pkl'))
+    
+    meta = {
+        'version': INCREMENTAL_VERSION,
+        'source': os.path.abspath(filepath),
+        'offset': offset,
+        'tail_sha256': tail_sha256,
+        'rows': state['rows'],
+        'columns': state['columns'],
+        'missing': {k: int(v) for k, v in state['missing'].items()},
+        'date_min': state['date_min'].isoformat(),
+        'date_max': state['date_max'].isoformat(),
+    }
+    tmp_path = os.path.join(state_dir, 'state.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(state_dir, 'state.json'))
+
+
+def load_incremental(filepath, state_dir, chunksize=500_000, sample_size=50_000,
+                     rebuild=False, seed=42, validation_path=None):
+    """Fold rows added since the last run into the persisted aggregates"""
+    print("="*70)
+    print("RETAIL SALES ANALYSIS - BUSINESS INTELLIGENCE REPORT")
+    print("="*70)
+    
+    state, meta = (None, None) if rebuild else read_incremental_state(state_dir, filepath)
+    size = os.path.getsize(filepath)
+    rows_before = state['rows'] if state else 0
+    
+    with open(filepath, 'rb') as f:
+        if state is not None and not (size >= meta['offset']
+                                      and _tail_digest(f, meta['offset']) == meta['tail_sha256']):
+            print(f"\n🔁 File rewritten since the last run, rebuilding from the full file")
+            state, rows_before = None, 0
+        
+        if state is None:
+            if meta is None:
+                print(f"\n🔁 No usable incremental state, building from the full file")
+            state = new_stream_state()
+            f.seek(0)
+            reader = pd.read_csv(f, chunksize=chunksize)
+        else:
+            print(f"\n🔁 Appending rows after byte {meta['offset']:,} of {size:,}")
+            f.seek(meta['offset'])
+            reader = (pd.read_csv(f, names=meta['columns'], header=None, chunksize=chunksize)
+                      if size > meta['offset'] else [])
+        
+        # Seed from the row count so each run draws fresh sampling keys
+        rng = np.random.default_rng([seed, rows_before])
+        for chunk in reader:
+            fold_chunk(state, apply_sales_schema(chunk), rng, sample_size)
+        
+        write_incremental_state(state_dir, filepath, state, size, _tail_digest(f, size))
+    
+    print(f"   ✓ {state['rows'] - rows_before:,} new rows folded into persisted state")
+    report_stream_state(state, verb='updated', validation_path=validation_path)
+    
+    return state['cube'], sample_rows(state)
+
+
+# ============================================================================
+# 12. STAGE PROFILING
+# ============================================================================
+
+def new_trace(enabled=False, profile_stage=None):
+    """Trace collecting per-stage timings and memory; inert unless enabled"""
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return {'enabled': enabled, 'profile_stage': profile_stage, 'stages': [], 'profile': None,
+            'critical_path': None}
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+@contextlib.contextmanager
+def traced_stage(trace, name):
+    """Record wall time, CPU time, memory and rows processed for one pipeline stage
+    
+    The yielded dict accepts a 'rows' entry set by the caller. When the trace's
+    profile_stage matches `name`, the stage also runs under cProfile.
+    """
+    record = {'stage': name, 'rows': None}
+    if not trace['enabled']:
+        yield record
+        return
+    
+    profiler = None
+    if trace['profile_stage'] == name:
+        import cProfile
+        profiler = cProfile.Profile()
+    
+    traced_before = tracemalloc.get_traced_memory()[0]
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler:
+            profiler.disable()
+            trace['profile'] = profiler
+        record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+        record['alloc_peak_mb'] = round((tracemalloc.get_traced_memory()[1] - traced_before) / 1e6, 2)
+        record['peak_rss_mb'] = _peak_rss_mb()
+        trace['stages'].append(record)
+
+
+def report_trace(trace, trace_path):
+    """Print the per-stage summary table and write the JSON trace (and cProfile stats)"""
+    if not trace['enabled']:
+        return
+    
+    print("\n" + "="*70)
+    print("STAGE PROFILE")
+    print("="*70)
+    print(f"\n{'Stage':<16}{'Wall (s)':>10}{'CPU (s)':>10}{'Alloc peak MB':>15}"
+          f"{'Peak RSS MB':>13}{'Rows':>14}")
+    for record in trace['stages']:
+        rss = f"{record['peak_rss_mb']:,.0f}" if record['peak_rss_mb'] is not None else '-'
+        rows = f"{record['rows']:,}" if record['rows'] is not None else '-'
+        print(f"{record['stage']:<16}{record['wall_s']:>10.3f}{record['cpu_s']:>10.3f}"
+              f"{record['alloc_peak_mb']:>15,.1f}{rss:>13}{rows:>14}")
+    total_wall = sum(record['wall_s'] for record in trace['stages'])
+    print(f"{'total':<16}{total_wall:>10.3f}")
+    if trace['critical_path']:
+        path, seconds = trace['critical_path']
+        print(f"\n🧭 Critical path: {' → '.join(path)} ({seconds:.3f} s)")
+    
+    with atomic_output(trace_path) as tmp_path, open(tmp_path, 'w') as f:
+        json.dump({
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'stages': trace['stages'],
+            'critical_path': trace['critical_path'],
+        }, f, indent=2)
+    print(f"\n✓ Trace saved: {os.path.basename(trace_path)}")
+    
+    if trace['profile'] is not None:
+        import pstats
+        stats_path = os.path.join(os.path.dirname(trace_path), f"profile_{trace['profile_stage']}.prof")
+        trace['profile'].dump_stats(stats_path)
+        print(f"✓ cProfile stats saved: {os.path.basename(stats_path)}\n")
+        pstats.Stats(trace['profile']).sort_stats('cumulative').print_stats(15)
+
+
+# ============================================================================
+# 13. PARTITIONED INGESTION
+# ============================================================================
+
+# Upstream drops one CSV per store per month. Each partition is read and
+# aggregated in its own worker process (in bounded chunks), and only the
+# small partial states are sent back and merged, so the concatenated frame
+# is never built. A year-month in the file name (e.g. store12_2025-03.csv)
+# lets partitions outside the requested date range be skipped unread.
+PARTITION_MONTH = re.compile(r'(?<!\d)(\d{4})[-_]?(\d{2})(?!\d)')
+
+
+def resolve_partitions(data_path):
+    """CSV files named by a file path, a directory or a glob pattern"""
+    if os.path.isdir(data_path):
+        return sorted(glob.glob(os.path.join(data_path, '*.csv')))
+    if glob.has_magic(data_path):
+        return sorted(glob.glob(data_path))
+    return [data_path] if os.path.exists(data_path) else []
+
+
+def partition_month(path):
+    """Month encoded in a partition's file name, or None"""
+    match = PARTITION_MONTH.search(os.path.basename(path))
+    if match and 1 <= int(match.group(2)) <= 12:
+        return pd.Period(f'{match.group(1)}-{match.group(2)}', freq='M')
+    return None
+
+
+def prune_partitions(paths, date_from=None, date_to=None):
+    """Drop partitions whose file-name month lies outside [date_from, date_to]"""
+    kept = []
+    for path in paths:
+        month = partition_month(path)
+        if month is not None:
+            if date_from is not None and month.end_time < date_from:
+                continue
+            if date_to is not None and month.start_time > date_to:
+                continue
+        kept.append(path)
+    return kept
+
+
+def read_partition(path, chunksize=500_000, sample_size=50_000, seed=42,
+                   date_from=None, date_to=None):
+    """Worker: aggregate one partition into a stream state"""
+    # Sampling keys are seeded by the file, not its position in the list
+    path_key = hashlib.sha256(os.path.abspath(path).encode()).digest()[:8]
+    rng = np.random.default_rng([seed, int.from_bytes(path_key, 'little')])
+    state = new_stream_state()
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk = apply_sales_schema(chunk)
+        if date_from is not None:
+            chunk = chunk[chunk['Date'] >= date_from]
+        if date_to is not None:
+            chunk = chunk[chunk['Date'] <= date_to]
+        fold_chunk(state, chunk, rng, sample_size)
+    return state
+
+
+def merge_stream_states(states, sample_size=50_000):
+    """Combine partial stream states from independent partitions"""
+    states = [state for state in states if state['rows']]
+    if not states:
+        raise ValueError("no rows left after partition pruning and date filtering")
+    
+    merged = new_stream_state()
+    merged['cube'] = merge_cubes([state['cube'] for state in states])
+    merged['sample'] = pd.concat([state['sample'] for state in states],
+                                 ignore_index=True).nsmallest(sample_size, '_key')
+    merged['missing'] = functools.reduce(lambda a, b: a.add(b, fill_value=0),
+                                         [state['missing'] for state in states])
+    merged['rows'] = sum(state['rows'] for state in states)
+    merged['columns'] = states[0]['columns']
+    merged['date_min'] = min(state['date_min'] for state in states)
+    merged['date_max'] = max(state['date_max'] for state in states)
+    merged['validation'] = merge_validations([state['validation'] for state in states])
+    return merged
+
+
+# Partial aggregates by partition path, size, mtime and read options (not list
+# position, so adding or reordering files keeps the others); None unless watch
+# mode asked to keep them between runs
+_partition_states = None
+
+
+def keep_partition_states():
+    """Keep each partition's partial aggregate in memory for the next run"""
+    global _partition_states
+    _partition_states = {}
+
+
+def load_partitions(paths, jobs=1, chunksize=500_000, date_from=None, date_to=None,
+                    validation_path=None):
+    """Read partitions in parallel and merge their partial aggregates"""
+    print("="*70)
+    print("RETAIL SALES ANALYSIS - BUSINESS INTELLIGENCE REPORT")
+    print("="*70)
+    
+    date_from = pd.Timestamp(date_from) if date_from else None
+    # A bare month or date as the upper bound includes that whole period
+    date_to = pd.Period(date_to).end_time if date_to else None
+    
+    kept = prune_partitions(paths, date_from, date_to)
+    print(f"\n🗂️  Partitions: {len(kept):,} of {len(paths):,} kept after date pruning")
+    
+    # Only new or rewritten partitions are read when states are being kept
+    global _partition_states
+    keys = [(os.path.abspath(path), os.stat(path).st_size, os.stat(path).st_mtime_ns, chunksize,
+             date_from, date_to, aggregation_backend) for path in kept]
+    known = _partition_states or {}
+    todo = [index for index, key in enumerate(keys) if key not in known]
+    if len(todo) < len(kept):
+        print(f"   ♻️  {len(kept) - len(todo):,} unchanged partition(s) reused from the previous run")
+    
+    read = functools.partial(read_partition, chunksize=chunksize,
+                             date_from=date_from, date_to=date_to)
+    if jobs > 1 and len(todo) > 1:
+        with worker_pool(jobs, initializer=use_backend, initargs=(aggregation_backend,)) as pool:
+            fresh = list(pool.map(read, [kept[index] for index in todo]))
+    else:
+        fresh = [read(kept[index]) for index in todo]
+    states = [known.get(key) for key in keys]
+    for index, partition_state in zip(todo, fresh):
+        states[index] = partition_state
+    if _partition_states is not None:
+        _partition_states = dict(zip(keys, states))
+    
+    state = merge_stream_states(states)
+    report_stream_state(state, verb='read from partitions', validation_path=validation_path)
+    
+    return state['cube'], sample_rows(state)
+
+
+# ============================================================================
+# 14. CALENDAR ROLLUPS
+# ============================================================================
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+
+def build_daily_rollup(cube):
+    """Roll the cube up to one row per date with integer calendar codes
+    
+    Codes come from datetime64 arithmetic on the (small) set of distinct
+    dates, so no per-row strings are formatted and the input is untouched.
+    """
+    daily = rollup_cube(cube, 'Date').sort_index().reset_index()
+    days = daily['Date'].to_numpy(dtype='datetime64[D]')
+    months = days.astype('datetime64[M]').astype(np.int64)
+    daily['Year'] = months // 12 + 1970
+    daily['Month_Num'] = months % 12 + 1
+    daily['Quarter'] = (daily['Month_Num'] - 1) // 3 + 1
+    iso = pd.DatetimeIndex(daily['Date']).isocalendar()
+    daily['ISO_Year'] = iso['year'].to_numpy(dtype=np.int64)
+    daily['Week'] = iso['week'].to_numpy(dtype=np.int64)
+    return daily
+
+
+def _calendar_totals(daily, keys):
+    """Revenue and order totals per calendar bucket"""
+    return daily.groupby(keys).agg(
+        Revenue=('Revenue', 'sum'),
+        Order_ID=('Order_Count', 'sum')
+    ).reset_index()
+
+
+def monthly_view(daily):
+    """Revenue and orders per calendar month, in date order"""
+    monthly = _calendar_totals(daily, ['Year', 'Month_Num'])
+    monthly.insert(2, 'Month_Name', np.array(MONTH_NAMES)[monthly['Month_Num'] - 1])
+    return monthly
+
+
+def quarterly_view(daily):
+    """Revenue and orders per calendar quarter"""
+    return _calendar_totals(daily, ['Year', 'Quarter'])
+
+
+def weekly_view(daily):
+    """Revenue and orders per ISO week, labelled by the week's Monday"""
+    weekly = _calendar_totals(daily, ['ISO_Year', 'Week'])
+    monday = pd.to_datetime(weekly['ISO_Year'].astype(str) + weekly['Week'].astype(str).str.zfill(2) + '1',
+                            format='%G%V%u')
+    weekly.index = pd.Index(monday.dt.strftime('%a %Y-%m-%d'), name='Week_Of')
+    return weekly
+
+
+def month_of_year_view(daily):
+    """Average order revenue for each month of the year, across all years"""
+    totals = daily.groupby('Month_Num')[['Revenue', 'Revenue_Count']].sum()
+    pattern = (totals['Revenue'] / totals['Revenue_Count']).reindex(range(1, 13))
+    pattern.index = pd.Index(MONTH_NAMES, name='Month_Name')
+    return pattern
+
+
+# ============================================================================
+# 15. TOP-N SELECTION
+# ============================================================================
+
+def top_n_rows(table, column, n):
+    """Largest `n` rows of `table` by `column`, in descending order
+    
+    np.argpartition selects the candidates in O(len(table)); only those `n`
+    rows are then sorted, instead of sorting the whole table.
+    """
+    values = table[column].to_numpy(dtype=float)
+    if n < len(values):
+        # NaN sorts last under argpartition, so negate and keep the front
+        candidates = np.argpartition(-values, n - 1)[:n]
+        table = table.iloc[candidates]
+    return table.sort_values(column, ascending=False)
+
+
+def top_n_per_group(cube, group, item, measure, n):
+    """Top `n` items by `measure` within every `group` value, in one vectorized pass
+    
+    E.g. top_n_per_group(cube, 'Region', 'Product', 'Revenue', 10) gives the
+    ten best-selling products for each region.
+    """
+    totals = rollup_cube(cube, [group, item])[measure].reset_index()
+    group_codes = pd.factorize(totals[group])[0]
+    
+    # Sort once by (group, descending measure), then rank within each group
+    order = np.lexsort((-totals[measure].to_numpy(dtype=float), group_codes))
+    ranked = totals.iloc[order].reset_index(drop=True)
+    codes = group_codes[order]
+    group_start = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+    rank = np.arange(len(ranked)) - np.repeat(group_start, np.diff(np.r_[group_start, len(ranked)]))
+    
+    ranked['Rank'] = rank + 1
+    return ranked[rank < n].set_index([group, 'Rank'])
+
+
+# ============================================================================
+# 16. ANALYTICS SERVER
+# ============================================================================
+
+# Loads the dataset once and answers report queries over local HTTP from the
+# in-memory cube. Every query filters the cube (not the raw rows) and then
+# reuses the analysis stages with rendering skipped; serialized responses
+# are kept in an LRU cache keyed by endpoint and normalized filters.
+SERVER_ENDPOINTS = ['kpis', 'top-products', 'regions', 'seasonality']
+SERVER_MAX_TOP_N = 1000
+
+
+def filter_cube(cube, date_from=None, date_to=None, region=None):
+    """Restrict the cube to a date range and/or comma-separated regions"""
+    mask = np.ones(len(cube), dtype=bool)
+    if date_from:
+        mask &= (cube['Date'] >= pd.Timestamp(date_from)).to_numpy()
+    if date_to:
+        mask &= (cube['Date'] <= pd.Period(date_to).end_time).to_numpy()
+    if region:
+        mask &= cube['Region'].isin(region.split(',')).to_numpy()
+    return cube[mask]
+
+
+def top_n_param(value):
+    """The `n` query parameter as an integer from 1 to SERVER_MAX_TOP_N"""
+    try:
+        n = int(value)
+    except ValueError:
+        raise ValueError(f"n must be an integer, got {value!r}") from None
+    if not 1 <= n <= SERVER_MAX_TOP_N:
+        raise ValueError(f"n must be between 1 and {SERVER_MAX_TOP_N}, got {n}")
+    return n
+
+
+def query_report(cube, endpoint, params):
+    """Answer one server query as a JSON-ready dict"""
+    filtered = filter_cube(cube, params.get('date_from'), params.get('date_to'),
+                           params.get('region'))
+    if filtered.empty:
+        raise ValueError("no data matches the filters")
+    
+    # The stages print their report sections; queries only need the tables
+    with contextlib.redirect_stdout(io.StringIO()):
+        if endpoint == 'kpis':
+            return {'kpis': calculate_kpis(filtered)}
+        if endpoint == 'top-products':
+            n = top_n_param(params.get('n', '10'))
+            by = params.get('by')
+            if by:
+                if by == 'Product':
+                    raise ValueError("cannot group top products by Product itself; "
+                                     "omit 'by' for the overall ranking")
+                if by not in CUBE_DIMENSIONS:
+                    raise ValueError(f"cannot group by {by!r}")
+                return {'top_products': table_records(
+                    top_n_per_group(filtered, by, 'Product', 'Revenue', n)
+                )}
+            product_revenue = analyze_top_products(filtered, None, top_n=n, render=skip_render)
+            return {'top_products': table_records(top_n_rows(product_revenue, 'Total_Revenue', n))}
+        if endpoint == 'regions':
+            return {'regions': table_records(analyze_regions(filtered, None, render=skip_render))}
+        if endpoint == 'seasonality':
+            monthly_revenue, seasonal_pattern = analyze_seasonality(filtered, None,
+                                                                     render=skip_render)
+            return {
+                'monthly_revenue': table_records(monthly_revenue),
+                'seasonal_pattern': table_records(seasonal_pattern.rename('Avg_Revenue')),
+            }
+    raise KeyError(endpoint)
+
+
+def make_request_handler(cube, cache_size=256):
+    """HTTP handler class answering queries from `cube` with an LRU response cache"""
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import parse_qsl, urlsplit
+    
+    @functools.lru_cache(maxsize=cache_size)
+    def answer(endpoint, params):
+        payload = query_report(cube, endpoint, dict(params))
+        return json.dumps(payload, default=_json_default).encode()
+    
+    class SalesQueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            endpoint = url.path.strip('/')
+            params = tuple(sorted(parse_qsl(url.query)))
+            
+            if endpoint == '':
+                status, body = 200, json.dumps({
+                    'endpoints': SERVER_ENDPOINTS,
+                    'filters': ['date_from', 'date_to', 'region'],
+                    'cache': answer.cache_info()._asdict(),
+                }).encode()
+            elif endpoint not in SERVER_ENDPOINTS:
+                status, body = 404, json.dumps({'error': f"unknown endpoint {endpoint!r}"}).encode()
+            else:
+                try:
+                    status, body = 200, answer(endpoint, params)
+                except ValueError as exc:
+                    status, body = 400, json.dumps({'error': str(exc)}).encode()
+            
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    
+    return SalesQueryHandler
+
+
+def serve(cube, host='127.0.0.1', port=8765, cache_size=256):
+    """Serve report queries from the warm cube until interrupted"""
+    from http.server import HTTPServer
+    
+    server = HTTPServer((host, port), make_request_handler(cube, cache_size))
+    print(f"\n🛰️  Serving sales analytics on http://{host}:{port}/")
+    print(f"   Endpoints: {', '.join('/' + name for name in SERVER_ENDPOINTS)}")
+    print(f"   Filters: ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&region=Europe,Asia Pacific")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n✓ Server stopped")
+    finally:
+        server.server_close()
+
+
+# ============================================================================
+# 17. STAGE RESULT CACHE
+# ============================================================================
+
+# Each stage's key hashes its name, its parameters, the keys of the stages it
+# depends on and this script's source; the root key is the content digest of
+# the input files. A changed input or parameter therefore changes the key of
+# that stage and of everything downstream. An entry stores the pickled return
+# value, the stage's console output and its files (PNG/PDF), which are copied
+# back into place on a hit. Entries record their last use in their meta.json
+# mtime; after each run, entries unused for RESULT_CACHE_MAX_AGE_DAYS are
+# evicted, then the least recently used until the cache fits
+# RESULT_CACHE_MAX_BYTES. Entries of the current run are always kept.
+RESULT_CACHE_VERSION = 1
+RESULT_CACHE_MAX_BYTES = 1 << 30
+RESULT_CACHE_MAX_AGE_DAYS = 30
+
+
+class _Tee(io.TextIOBase):
+    """Text stream writing to several streams at once"""
+    
+    def __init__(self, *streams):
+        self.streams = streams
+    
+    def write(self, text):
+        for stream in self.streams:
+            stream.write(text)
+        return len(text)
+    
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+
+def _refresh_digest(path, entry):
+    """Index entry for `path`, re-hashing only what changed since `entry`
+    
+    An unchanged size and mtime keep the digest. A file that only grew (the
+    bytes before its old end hash the same over the tail window, the check
+    incremental mode relies on) chains the old digest with the appended bytes;
+    anything else is hashed in full.
+    """
+    stat = os.stat(path)
+    if entry and (entry['size'], entry['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return entry
+    
+    with open(path, 'rb') as f:
+        if entry and stat.st_size > entry['size'] and _tail_digest(f, entry['size']) == entry['tail_sha256']:
+            digest = hashlib.sha256(entry['sha256'].encode())
+            f.seek(entry['size'])
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+            sha256 = digest.hexdigest()
+        else:
+            sha256 = _file_digest(path)
+        tail_sha256 = _tail_digest(f, stat.st_size)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256, 'tail_sha256': tail_sha256}
+
+
+def file_digests(paths, cache_dir):
+    """Content digest of each file, memoized per path in fingerprints.json under `cache_dir`"""
+    index_path = os.path.join(cache_dir, 'fingerprints.json')
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    
+    digests = []
+    for path in paths:
+        key = os.path.abspath(path)
+        previous = index.get(key)
+        index[key] = _refresh_digest(path, previous if isinstance(previous, dict) else None)
+        digests.append(index[key]['sha256'])
+    
+    os.makedirs(cache_dir, exist_ok=True)
+    with atomic_output(index_path) as tmp_path, open(tmp_path, 'w') as f:
+        json.dump({key: entry for key, entry in index.items() if isinstance(entry, dict)}, f, indent=2)
+    return digests
+
+
+def data_fingerprint(paths, cache_dir=None):
+    """Content digest of the input files; with `cache_dir`, appends are hashed over the new bytes only"""
+    digests = file_digests(paths, cache_dir) if cache_dir else [_file_digest(path) for path in paths]
+    return hashlib.sha256('\n'.join(digests).encode()).hexdigest()
+
+
+def new_result_cache(results_dir):
+    """Stage result cache rooted at `results_dir`"""
+    return {
+        'dir': results_dir,
+        'code': _file_digest(os.path.abspath(__file__)),
+        'pending': [],
+        'used': set(),
+    }
+
+
+def stage_key(memo, name, params, deps):
+    """Content address of one stage run"""
+    payload = json.dumps({
+        'version': RESULT_CACHE_VERSION,
+        'code': memo['code'] if memo else None,
+        'stage': name,
+        'params': params,
+        'deps': deps,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def run_memoized(memo, name, params, deps, fn, outputs=()):
+    """Run a stage, or replay its stored result, console output and files; returns (key, result)"""
+    key = stage_key(memo, name, params, deps)
+    if memo is None:
+        return key, fn()
+    
+    entry_dir = os.path.join(memo['dir'], key)
+    meta_path = os.path.join(entry_dir, 'meta.json')
+    memo['used'].add(entry_dir)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        result = pd.read_pickle(os.path.join(entry_dir, 'result.pkl'))
+        for output in outputs:
+            with atomic_output(output) as tmp_path:
+                shutil.copyfile(os.path.join(entry_dir, os.path.basename(output)), tmp_path)
+        os.utime(meta_path)
+        sys.stdout.write(meta['stdout'])
+        print(f"   ♻️  Reused cached '{name}' stage ({key[:12]})")
+        return key, result
+    
+    with captured_stdout() as captured:
+        result = fn()
+    memo['pending'].append((entry_dir, name, result, captured.getvalue(), list(outputs)))
+    return key, result
+
+
+def commit_memoized(memo):
+    """Store the stages run since the last commit, once their output files exist"""
+    if memo is None:
+        return
+    
+    for entry_dir, name, result, stdout, outputs in memo['pending']:
+        if not all(os.path.exists(output) for output in outputs):
+            continue
+        tmp_dir = f'{entry_dir}.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        pd.to_pickle(result, os.path.join(tmp_dir, 'result.pkl'))
+        for output in outputs:
+            shutil.copyfile(output, os.path.join(tmp_dir, os.path.basename(output)))
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({
+                'stage': name,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'outputs': [os.path.basename(output) for output in outputs],
+                'stdout': stdout,
+            }, f, indent=2)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+    memo['pending'] = []
+    prune_result_cache(memo)
+
+
+def prune_result_cache(memo, max_bytes=RESULT_CACHE_MAX_BYTES, max_age_days=RESULT_CACHE_MAX_AGE_DAYS):
+    """Evict stale entries, then least recently used ones, until the cache fits `max_bytes`"""
+    entries = []
+    for entry in (os.scandir(memo['dir']) if os.path.isdir(memo['dir']) else []):
+        meta_path = os.path.join(entry.path, 'meta.json')
+        if entry.path in memo['used'] or entry.name.endswith('.tmp') or not os.path.exists(meta_path):
+            continue
+        size = sum(item.stat().st_size for item in os.scandir(entry.path))
+        entries.append((os.path.getmtime(meta_path), size, entry.path))
+    
+    total = sum(size for _, size, _ in entries) + sum(
+        item.stat().st_size for entry_dir in memo['used'] if os.path.isdir(entry_dir)
+        for item in os.scandir(entry_dir))
+    cutoff = time.time() - max_age_days * 86400
+    evicted = 0
+    for last_used, size, entry_dir in sorted(entries):
+        if last_used >= cutoff and total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        evicted += 1
+    if evicted:
+        print(f"   🧹 Evicted {evicted} unused result cache entries ({total / 2**20:,.0f} MB kept)")
+
+
+# ============================================================================
+# 18. APPROXIMATE ANALYTICS
+# ============================================================================
+
+# Approximate mode reads a seeded Bernoulli sample of each file's rows. Skipped
+# rows are never converted, though every row is still tokenized, and a second
+# Product-only pass feeds the distinct count, so a 5% sample loads only about
+# 1.5-2x faster than the full file, not 20x. The sample's cube is scaled
+# up to population estimates so every stage runs unchanged, and the KPIs are
+# re-reported with 95% confidence intervals: means use the sample's own
+# variance, distinct counts come from HyperLogLog registers and
+# order-value percentiles from a relative-error quantile sketch (log-spaced
+# buckets, so every reported percentile is within QUANTILE_SKETCH_ALPHA of a
+# sampled value). Both sketches are fixed-size and merge by max/addition.
+HLL_PRECISION = 12
+QUANTILE_SKETCH_ALPHA = 0.01
+ORDER_VALUE_PERCENTILES = [0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+Z_95 = 1.96
+
+
+def hll_registers(values, precision=HLL_PRECISION):
+    """HyperLogLog registers for a column of values; merge registers with np.maximum"""
+    hashes = pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy()
+    bucket = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    # Rank = leading zeros of the remaining bits + 1, read off the top 53 bits
+    # (exact in float64), capped at the number of bits available
+    top = (hashes << np.uint64(precision)) >> np.uint64(11)
+    rank = np.minimum(53 - (np.frexp(top.astype(np.float64))[1] - 1), 64 - precision + 1)
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    np.maximum.at(registers, bucket, rank.astype(np.uint8))
+    return registers
+
+
+def hll_count(registers):
+    """Distinct-count estimate and 95% CI half-width from HyperLogLog registers"""
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and zeros:
+        # Small-range correction: linear counting over the empty registers
+        estimate = m * np.log(m / zeros)
+    return estimate, Z_95 * 1.04 / np.sqrt(m) * estimate
+
+
+def quantile_sketch(values, alpha=QUANTILE_SKETCH_ALPHA):
+    """Counts per log-spaced bucket; merge sketches with Series.add(fill_value=0)"""
+    gamma = (1 + alpha) / (1 - alpha)
+    buckets = np.ceil(np.log(np.maximum(np.asarray(values, dtype=np.float64), 1e-9)) / np.log(gamma))
+    return pd.Series(buckets.astype(np.int64)).value_counts().sort_index()
+
+
+def sketch_quantiles(sketch, ranks, alpha=QUANTILE_SKETCH_ALPHA):
+    """Values at the given 0-based ranks, each within `alpha` relative error"""
+    gamma = (1 + alpha) / (1 - alpha)
+    cumulative = sketch.cumsum().to_numpy()
+    ranks = np.clip(ranks, 0, cumulative[-1] - 1)
+    buckets = sketch.index.to_numpy()[np.searchsorted(cumulative, ranks, side='right')]
+    return 2 * np.power(gamma, buckets) / (gamma + 1)
+
+
+def ht_total(values, fraction):
+    """Horvitz-Thompson population total and 95% CI half-width from a Bernoulli sample"""
+    values = np.asarray(values, dtype=np.float64)
+    variance = (1 - fraction) / fraction**2 * np.sum(values**2)
+    return values.sum() / fraction, Z_95 * np.sqrt(variance)
+
+
+def sample_mean(sample, column, fraction, by=()):
+    """Mean of `column` with 95% CI half-width, per `by` group
+    
+    The variance is the whole sample's (or group's), between-group spread
+    included; weighting strata by their sample counts and keeping only the
+    within-stratum variance would understate it.
+    """
+    values = sample.groupby(list(by), observed=True)[column] if by else sample[column]
+    count, mean, variance = values.count(), values.mean(), values.var()
+    return mean, Z_95 * np.sqrt((1 - fraction) * variance / count)
+
+
+def sample_ratio(sample, numerator, denominator, fraction):
+    """Ratio of two column totals, with a linearised 95% CI half-width"""
+    ratio = sample[numerator].sum() / sample[denominator].sum()
+    residuals = sample.assign(_residual=sample[numerator] - ratio * sample[denominator])
+    _, half_width = sample_mean(residuals, '_residual', fraction)
+    return ratio, half_width / sample[denominator].mean()
+
+
+def read_sample(path, index=0, fraction=0.05, seed=42, date_from=None, date_to=None):
+    """Worker: read a seeded Bernoulli sample of one file's rows"""
+    draw = random.Random(f'{seed}:{index}').random
+    sample = apply_sales_schema(pd.read_csv(path, skiprows=lambda i: i > 0 and draw() >= fraction))
+    if date_from is not None:
+        sample = sample[sample['Date'] >= date_from]
+    if date_to is not None:
+        sample = sample[sample['Date'] <= date_to]
+    return sample
+
+
+def product_registers(path, index=0, date_from=None, date_to=None, chunksize=500_000):
+    """Worker: HyperLogLog registers of every Product in one file, from a Product-only pass
+    
+    Distinct counts do not scale up from a row sample (a long-tail catalog
+    mostly appears once or never in it), so the sketch reads the full column.
+    Registers ignore repeats, so only each chunk's distinct products are hashed.
+    """
+    filtered = date_from is not None or date_to is not None
+    registers = np.zeros(1 << HLL_PRECISION, dtype=np.uint8)
+    for chunk in pd.read_csv(path, usecols=['Product', 'Date'] if filtered else ['Product'],
+                             dtype={'Product': 'category'}, chunksize=chunksize):
+        if filtered:
+            dates = parse_dates(chunk['Date'])
+            keep = pd.Series(True, index=chunk.index)
+            if date_from is not None:
+                keep &= dates >= date_from
+            if date_to is not None:
+                keep &= dates <= date_to
+            chunk = chunk[keep]
+        registers = np.maximum(registers, hll_registers(chunk['Product'].dropna().unique()))
+    return registers
+
+
+def load_sample(paths, fraction, jobs=1, date_from=None, date_to=None, seed=42):
+    """Read a row sample of every partition and scale its cube to population estimates"""
+    print("="*70)
+    print("RETAIL SALES ANALYSIS - BUSINESS INTELLIGENCE REPORT")
+    print("="*70)
+    
+    date_from = pd.Timestamp(date_from) if date_from else None
+    date_to = pd.Period(date_to).end_time if date_to else None
+    kept = prune_partitions(paths, date_from, date_to)
+    
+    read = functools.partial(read_sample, fraction=fraction, seed=seed,
+                             date_from=date_from, date_to=date_to)
+    sketch = functools.partial(product_registers, date_from=date_from, date_to=date_to)
+    if jobs > 1 and len(kept) > 1:
+        with worker_pool(jobs) as pool:
+            samples = list(pool.map(read, kept, range(len(kept))))
+            registers = list(pool.map(sketch, kept, range(len(kept))))
+    else:
+        samples = [read(path, index) for index, path in enumerate(kept)]
+        registers = [sketch(path, index) for index, path in enumerate(kept)]
+    
+    # Partitions carry their own category sets; re-unify them after concatenating
+    sample = pd.concat(samples, ignore_index=True)
+    for column in CATEGORICAL_COLUMNS:
+        sample[column] = sample[column].astype('category')
+    if sample.empty:
+        raise ValueError("no rows sampled; raise the --approx fraction")
+    
+    print(f"\n🎲 Approximate mode: {len(sample):,} rows sampled "
+          f"({fraction:.1%} of {len(kept):,} file(s))")
+    print(f"   Date Range: {sample['Date'].min().date()} to {sample['Date'].max().date()}")
+    
+    cube = build_sales_cube(sample)
+    for measure in CUBE_MEASURES:
+        scaled = cube[measure] / fraction
+        cube[measure] = (scaled.round().astype(np.int64)
+                         if pd.api.types.is_integer_dtype(cube[measure]) else scaled)
+    
+    # The product count comes from the full-column sketch, not the sample
+    sample.attrs['product_registers'] = np.maximum.reduce(registers)
+    cube.attrs['unique_products'] = round(hll_count(sample.attrs['product_registers'])[0])
+    return cube, sample
+
+
+def approximate_kpis(sample, fraction):
+    """Report the KPIs, order-value percentiles and seasonality with 95% confidence intervals
+    
+    Unique products come from a sketch of the full Product column, so their
+    interval is the HyperLogLog error alone.
+    """
+    print("\n" + "="*70)
+    print("APPROXIMATE ESTIMATES (95% CONFIDENCE INTERVALS)")
+    print("="*70)
+    
+    registers = sample.attrs.get('product_registers')
+    if registers is None:
+        registers = hll_registers(sample['Product'])
+    estimates = {
+        'total_revenue': ht_total(sample['Revenue'], fraction),
+        'total_orders': ht_total(np.ones(len(sample)), fraction),
+        'avg_order_value': sample_mean(sample, 'Revenue', fraction),
+        'total_units': ht_total(sample['Quantity'], fraction),
+        'avg_units_per_order': sample_mean(sample, 'Quantity', fraction),
+        'unique_products': hll_count(registers),
+        'avg_unit_price': sample_mean(sample, 'Unit_Price', fraction),
+        'revenue_per_unit': sample_ratio(sample, 'Revenue', 'Quantity', fraction),
+    }
+    labels = {
+        'total_revenue': ('💰 Total Revenue', '${:,.2f}'),
+        'total_orders': ('📦 Total Orders', '{:,.0f}'),
+        'avg_order_value': ('💵 Average Order Value', '${:,.2f}'),
+        'total_units': ('📊 Total Units Sold', '{:,.0f}'),
+        'avg_units_per_order': ('📈 Average Units per Order', '{:.2f}'),
+        'unique_products': ('🏷️  Unique Products', '{:,.0f}'),
+        'avg_unit_price': ('💲 Average Unit Price', '${:.2f}'),
+        'revenue_per_unit': ('📊 Revenue per Unit', '${:.2f}'),
+    }
+    print(f"\n🎲 Estimated from {len(sample):,} sampled rows ({fraction:.1%})")
+    for key, (estimate, half_width) in estimates.items():
+        label, fmt = labels[key]
+        print(f"{label}: {fmt.format(estimate)} ± {fmt.format(half_width)}")
+    
+    # Percentile CIs bracket the rank n·q by the binomial spread of the sample,
+    # widened by the sketch's own relative error
+    sketch = quantile_sketch(sample['Revenue'])
+    n = len(sample)
+    q = np.array(ORDER_VALUE_PERCENTILES)
+    spread = Z_95 * np.sqrt(n * q * (1 - q))
+    percentiles = pd.DataFrame({
+        'Order_Value': sketch_quantiles(sketch, q * (n - 1)),
+        'CI_Low': sketch_quantiles(sketch, np.floor(q * n - spread)) * (1 - QUANTILE_SKETCH_ALPHA),
+        'CI_High': sketch_quantiles(sketch, np.ceil(q * n + spread)) * (1 + QUANTILE_SKETCH_ALPHA),
+    }, index=pd.Index([f'P{round(p * 100)}' for p in q], name='Percentile')).round(2)
+    print(f"\n🧾 Order Value Percentiles:")
+    print(percentiles)
+    
+    # Seasonality: average order revenue per month of the year
+    months = sample.assign(Month_Num=sample['Date'].dt.month)
+    seasonal, seasonal_ci = sample_mean(months, 'Revenue', fraction, by=['Month_Num'])
+    seasonal_pattern = pd.DataFrame({'Avg_Revenue': seasonal, 'CI': seasonal_ci}).reindex(range(1, 13))
+    seasonal_pattern.index = pd.Index(MONTH_NAMES, name='Month_Name')
+    print(f"\n📅 Average Order Revenue by Month:")
+    print(seasonal_pattern.round(2))
+    
+    return {
+        'fraction': fraction,
+        'sampled_rows': n,
+        'kpis': {key: {'estimate': estimate, 'ci_95': half_width}
+                 for key, (estimate, half_width) in estimates.items()},
+        'order_value_percentiles': percentiles,
+        'seasonal_pattern': seasonal_pattern,
+    }
+
+
+# ============================================================================
+# 19. DATA VALIDATION
+# ============================================================================
+
+# Row-level rules run as vectorized column checks one chunk at a time, so the
+# same code validates an in-memory table, a stream or a set of partitions.
+# Duplicates are detected by Order_ID hash: the state keeps a sorted array of
+# the 64-bit hashes seen so far (8 bytes per order) rather than hashing whole
+# rows. That array grows with the number of distinct orders and is re-copied
+# as each chunk's new hashes are merged in, so it is the one piece of the
+# streaming state that is not fixed-size. Only per-rule counts and a few
+# example rows are kept for the report.
+VALIDATION_RULES = ['missing_values', 'non_positive_values', 'revenue_mismatch',
+                    'date_out_of_range', 'duplicate_order_id']
+REVENUE_TOLERANCE = 0.01
+VALID_DATE_MIN = pd.Timestamp('2000-01-01')
+VIOLATION_EXAMPLES = 5
+
+
+def new_validation_state():
+    """Empty running state for chunked validation"""
+    return {
+        'rows': 0,
+        'counts': dict.fromkeys(VALIDATION_RULES, 0),
+        'examples': {rule: [] for rule in VALIDATION_RULES},
+        'order_hashes': np.empty(0, dtype=np.uint64),
+    }
+
+
+def order_id_hashes(order_ids):
+    """64-bit hash of each Order_ID"""
+    return pd.util.hash_pandas_object(pd.Series(order_ids), index=False).to_numpy()
+
+
+def rule_violations(chunk):
+    """Boolean mask of offending rows for each row-level rule"""
+    expected = chunk['Quantity'].to_numpy(np.float64) * chunk['Unit_Price'].to_numpy(np.float64)
+    return {
+        'missing_values': chunk.isnull().any(axis=1).to_numpy(),
+        'non_positive_values': ((chunk['Quantity'] <= 0) | (chunk['Unit_Price'] <= 0)
+                                | (chunk['Revenue'] < 0)).to_numpy(),
+        'revenue_mismatch': np.abs(chunk['Revenue'].to_numpy(np.float64) - expected) > REVENUE_TOLERANCE,
+        # A missing date is already a missing value, not an out-of-range one
+        'date_out_of_range': (chunk['Date'].notna()
+                              & ~chunk['Date'].between(VALID_DATE_MIN, pd.Timestamp.now())).to_numpy(),
+    }
+
+
+def fold_validation(validation, chunk):
+    """Run every rule over one parsed chunk and fold the results into the running state"""
+    masks = rule_violations(chunk)
+    
+    # Duplicates: repeated within the chunk, or already seen in earlier chunks.
+    # One stable sort of the chunk's hashes gives both: later copies follow
+    # their first occurrence, and the distinct hashes come out sorted for the
+    # lookup in (and merge into) the seen array.
+    hashes = order_id_hashes(chunk['Order_ID'])
+    order = np.argsort(hashes, kind='stable')
+    ordered = hashes[order]
+    first = np.r_[True, ordered[1:] != ordered[:-1]]
+    distinct = ordered[first]
+    seen = validation['order_hashes']
+    if len(seen):
+        in_seen = seen[np.minimum(np.searchsorted(seen, distinct), len(seen) - 1)] == distinct
+    else:
+        in_seen = np.zeros(len(distinct), dtype=bool)
+    duplicate = np.empty(len(hashes), dtype=bool)
+    duplicate[order] = ~first | in_seen[np.cumsum(first) - 1]
+    masks['duplicate_order_id'] = duplicate
+    fresh = distinct[~in_seen]
+    validation['order_hashes'] = np.insert(seen, np.searchsorted(seen, fresh), fresh)
+    
+    validation['rows'] += len(chunk)
+    for rule, mask in masks.items():
+        count = int(mask.sum())
+        room = VIOLATION_EXAMPLES - len(validation['examples'][rule])
+        validation['counts'][rule] += count
+        if count and room > 0:
+            # Amounts are in cents; two decimals keep float noise out of the report
+            examples = chunk[mask].head(room)
+            validation['examples'][rule] += json.loads(
+                examples.to_json(orient='records', date_format='iso', double_precision=2)
+            )
+    return validation
+
+
+def merge_validations(validations):
+    """Combine validation states from independent partitions"""
+    merged = new_validation_state()
+    hashes = np.sort(np.concatenate([validation['order_hashes'] for validation in validations]))
+    merged['order_hashes'] = hashes[np.r_[True, hashes[1:] != hashes[:-1]]]
+    merged['rows'] = sum(validation['rows'] for validation in validations)
+    for rule in VALIDATION_RULES:
+        merged['counts'][rule] = sum(validation['counts'][rule] for validation in validations)
+        merged['examples'][rule] = [example for validation in validations
+                                    for example in validation['examples'][rule]][:VIOLATION_EXAMPLES]
+    # Each partition's hashes are unique, so any repeat spans partitions
+    merged['counts']['duplicate_order_id'] += len(hashes) - len(merged['order_hashes'])
+    return merged
+
+
+def report_validation(validation, report_path=None):
+    """Print the rule summary and write the violations report"""
+    counts = validation['counts']
+    print(f"✓ Duplicates: {counts['duplicate_order_id']:,} records (by Order_ID)")
+    
+    flagged = {rule: count for rule, count in counts.items() if count}
+    if flagged:
+        print(f"\n⚠️ Validation: {validation['rows']:,} rows checked, rule violations found:")
+        for rule, count in flagged.items():
+            print(f"   {rule}: {count:,} rows")
+    else:
+        print(f"✓ Validation: {validation['rows']:,} rows pass all {len(VALIDATION_RULES)} rules")
+    
+    if report_path:
+        report = {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'rows_checked': validation['rows'],
+            'revenue_tolerance': REVENUE_TOLERANCE,
+            'rules': {rule: {'violations': counts[rule], 'examples': validation['examples'][rule]}
+                      for rule in VALIDATION_RULES},
+        }
+        with atomic_output(report_path) as tmp_path, open(tmp_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Violations report: {os.path.basename(report_path)}")
+
+
+# ============================================================================
+# 20. AGGREGATION BACKENDS
+# ============================================================================
+
+# Building the cube is the only query that touches every row, so it is the
+# operation behind the backend interface; everything downstream reads the
+# (small) cube with pandas. Polars and DuckDB run the grouping on all cores and
+# are optional, imported on first use. Each backend returns the same table as
+# the pandas path: same columns, categories and first-appearance row order.
+aggregation_backend = 'pandas'
+
+
+def _coded_rows(df):
+    """Numpy-only view of the rows: dimensions as integer codes (-1 for missing)"""
+    rows, uniques = {}, {}
+    for column in CUBE_DIMENSIONS:
+        rows[column], uniques[column] = pd.factorize(df[column])
+    for column in ['Revenue', 'Quantity', 'Unit_Price']:
+        rows[column] = df[column].to_numpy(np.float64)
+    rows['Has_Order_ID'] = df['Order_ID'].notna().to_numpy(np.int64)
+    return rows, uniques
+
+
+def _decode_cube(cube, uniques, df):
+    """Map a backend's coded cube back to the columns and dtypes of the pandas cube"""
+    for column in CUBE_DIMENSIONS:
+        cube[column] = uniques[column].array.take(cube[column].to_numpy(), allow_fill=True)
+    for measure in CUBE_MEASURES:
+        cube[measure] = cube[measure].astype(np.int64 if measure.endswith('_Count') else np.float64)
+    if pd.api.types.is_integer_dtype(df['Quantity']):
+        cube['Quantity'] = cube['Quantity'].astype(np.int64)
+    cube['Unit_Price'] = cube['Unit_Price'].astype(df['Unit_Price'].dtype)
+    return cube[CUBE_DIMENSIONS + CUBE_MEASURES]
+
+
+def _aggregate_polars(df):
+    """Cube cells computed by Polars"""
+    import polars as pl
+    
+    rows, uniques = _coded_rows(df)
+    cube = pl.DataFrame(rows, nan_to_null=True).group_by(CUBE_DIMENSIONS, maintain_order=True).agg(
+        pl.col('Revenue').sum().alias('Revenue'),
+        pl.col('Revenue').count().alias('Revenue_Count'),
+        pl.col('Quantity').sum().alias('Quantity'),
+        pl.col('Quantity').count().alias('Quantity_Count'),
+        pl.col('Unit_Price').sum().alias('Unit_Price'),
+        pl.col('Unit_Price').count().alias('Unit_Price_Count'),
+        pl.col('Has_Order_ID').sum().alias('Order_Count'),
+        pl.len().alias('Row_Count'),
+    )
+    return _decode_cube(pd.DataFrame({name: cube[name].to_numpy() for name in cube.columns}),
+                        uniques, df)
+
+
+def _aggregate_duckdb(df):
+    """Cube cells computed by an in-process DuckDB connection
+    
+    SQL sums an all-NULL group to NULL; they are coalesced to 0 like pandas.
+    """
+    import duckdb
+    
+    rows, uniques = _coded_rows(df)
+    rows['_row'] = np.arange(len(df))
+    dimensions = ', '.join(f'"{column}"' for column in CUBE_DIMENSIONS)
+    with duckdb.connect() as con:
+        con.register('sales', pd.DataFrame(rows))
+        cube = con.execute(f"""
+            SELECT {dimensions},
+                   COALESCE(SUM(Revenue), 0) AS Revenue, COUNT(Revenue) AS Revenue_Count,
+                   COALESCE(SUM(Quantity), 0) AS Quantity, COUNT(Quantity) AS Quantity_Count,
+                   COALESCE(SUM(Unit_Price), 0) AS Unit_Price, COUNT(Unit_Price) AS Unit_Price_Count,
+                   SUM(Has_Order_ID) AS Order_Count, COUNT(*) AS Row_Count
+            FROM sales
+            GROUP BY {dimensions}
+            ORDER BY MIN(_row)
+        """).df()
+    return _decode_cube(cube, uniques, df)
+
+
+AGGREGATION_BACKENDS = {
+    'polars': _aggregate_polars,
+    'duckdb': _aggregate_duckdb,
+}
+
+
+def use_backend(name):
+    """Select the engine `aggregate_rows` runs on (also used as a pool initializer)"""
+    global aggregation_backend
+    aggregation_backend = name
+
+
+# ============================================================================
+# 21. BATCH SEGMENT REPORTS
+# ============================================================================
+
+# Batch mode writes one full report (console log, charts and PDF) per value of
+# the chosen dimensions, next to the global one. The dataset is loaded once;
+# workers are forked after it is in memory and read it copy-on-write through
+# `_batch_dataset`, so only (dimension, value, folder) crosses the process
+# boundary. Platforms without fork run the slices inline.
+BATCH_DIMENSIONS = ['Region', 'Sales_Channel', 'Customer_Segment', 'Category']
+_batch_dataset = {}
+
+
+def slice_slug(value):
+    """File-system friendly folder name for a dimension or value"""
+    return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-')
+
+
+def run_slice(dimension, value, slice_dir, top_n=10):
+    """Worker: run every report stage on one dimension value's rows"""
+    cube = _batch_dataset['cube']
+    cube = cube[cube[dimension] == value]
+    rows = _batch_dataset['df']
+    # Samples persisted by older incremental states lack the dimension columns
+    rows = rows[rows[dimension] == value] if dimension in rows else None
+    
+    os.makedirs(slice_dir, exist_ok=True)
+    with open(os.path.join(slice_dir, 'report.txt'), 'w') as log, contextlib.redirect_stdout(log):
+        print(f"SEGMENT REPORT: {dimension} = {value}")
+        kpis = calculate_kpis(cube)
+        product_revenue = analyze_top_products(cube, slice_dir, top_n=top_n)
+        regional_metrics = analyze_regions(cube, slice_dir)
+        _, seasonal_pattern = analyze_seasonality(cube, slice_dir)
+        additional_insights(rows, cube, slice_dir)
+        forecast = forecast_revenue(cube)
+        recommendations = generate_recommendations(cube, kpis, product_revenue,
+                                                   regional_metrics, seasonal_pattern, forecast)
+        create_summary_pdf(kpis, product_revenue, regional_metrics, seasonal_pattern,
+                           recommendations, slice_dir, slice_dir, forecast)
+    return kpis['total_revenue']
+
+
+def run_batch(cube, df, dimensions, output_root, jobs=1, top_n=10):
+    """Write one report folder per value of each dimension, fanned out to forked workers"""
+    print("\n" + "="*70)
+    print("BATCH SEGMENT REPORTS")
+    print("="*70)
+    
+    tasks = [(dimension, value, os.path.join(output_root, slice_slug(dimension), slice_slug(value)))
+             for dimension in dimensions
+             for value in sorted(cube[dimension].dropna().unique())]
+    
+    _batch_dataset.update(cube=cube, df=df)
+    run = functools.partial(run_slice, top_n=top_n)
+    try:
+        if jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            with ProcessPoolExecutor(max_workers=jobs,
+                                     mp_context=multiprocessing.get_context('fork')) as pool:
+                revenues = list(pool.map(run, *zip(*tasks)))
+        else:
+            revenues = [run(*task) for task in tasks]
+    finally:
+        _batch_dataset.clear()
+    
+    print()
+    for (dimension, value, slice_dir), revenue in zip(tasks, revenues):
+        print(f"   ✓ {dimension} = {value}: ${revenue:,.2f} → "
+              f"{os.path.relpath(slice_dir, output_root)}")
+    print(f"\n📦 {len(tasks)} segment reports written to: {output_root}")
+    
+    return dict(zip([task[:2] for task in tasks], revenues))
+
+
+# ============================================================================
+# 22. STAGE SCHEDULER
+# ============================================================================
+
+# The report is a DAG: each stage names the stages whose results it takes as
+# arguments and the files it writes. A stage starts on a thread as soon as its
+# inputs are ready, so the table work of independent analyses overlaps (the
+# pandas and numpy kernels release the GIL) while charts render one at a time
+# or in worker processes. Console output is captured per thread and printed in
+# declaration order, so the report reads as if the stages had run in sequence.
+PIPELINE_STAGES = ['load', 'kpis', 'approx', 'products', 'regions', 'seasonality',
+                   'rolling', 'insights', 'forecast', 'recommendations', 'pdf', 'export']
+
+
+def pipeline_stage(name, fn, inputs=(), params=None, files=(), rows=None):
+    """One pipeline stage; `fn` is called with the results of `inputs`, in order
+    
+    `rows`, if given, is called with the stage's result and inputs and returns
+    the row count recorded in the profile trace.
+    """
+    return {'name': name, 'fn': fn, 'inputs': list(inputs), 'params': params or {},
+            'files': list(files), 'rows': rows}
+
+
+def select_stages(stages, targets=None):
+    """The target stages plus everything they depend on, in declaration order"""
+    if not targets:
+        return list(stages)
+    
+    by_name = {stage['name']: stage for stage in stages}
+    needed, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(by_name[name]['inputs'])
+    return [stage for stage in stages if stage['name'] in needed]
+
+
+class _StdoutRouter(io.TextIOBase):
+    """stdout that sends each thread's writes to the stream that thread chose"""
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+    
+    def target(self):
+        return getattr(self.local, 'stream', self.stream)
+    
+    def write(self, text):
+        return self.target().write(text)
+    
+    def flush(self):
+        self.target().flush()
+
+
+@contextlib.contextmanager
+def captured_stdout():
+    """Copy this thread's console output into the yielded buffer, still passing it on"""
+    buffer = io.StringIO()
+    router = sys.stdout
+    if not isinstance(router, _StdoutRouter):
+        with contextlib.redirect_stdout(_Tee(router, buffer)):
+            yield buffer
+        return
+    
+    previous = router.target()
+    router.local.stream = _Tee(previous, buffer)
+    try:
+        yield buffer
+    finally:
+        router.local.stream = previous
+
+
+def worker_pool(jobs, initializer=None, initargs=()):
+    """Process pool that is safe to start from a scheduler thread
+    
+    A child forked while another thread holds a lock (stdout's, say) can
+    deadlock on it, so workers come from a forkserver where the platform has one.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                               initializer=initializer, initargs=initargs)
+
+
+def _run_stage(stage, results, keys, memo, trace, router):
+    """Run one stage on a scheduler thread; returns (key, result, console output, wall seconds)"""
+    args = [results[name] for name in stage['inputs']]
+    buffer = io.StringIO()
+    router.local.stream = buffer
+    start = time.perf_counter()
+    try:
+        with traced_stage(trace, stage['name']) as record:
+            key, result = run_memoized(memo, stage['name'], stage['params'],
+                                       [keys[name] for name in stage['inputs']],
+                                       lambda: stage['fn'](*args), outputs=stage['files'])
+            if stage['rows']:
+                record['rows'] = stage['rows'](result, *args)
+    except BaseException:
+        # Show what the failing stage printed before the traceback
+        router.stream.write(buffer.getvalue())
+        raise
+    finally:
+        router.local.stream = router.stream
+    return key, result, buffer.getvalue(), time.perf_counter() - start
+
+
+def run_pipeline(stages, trace, memo=None, workers=None):
+    """Run every stage once its inputs are ready; returns ({name: result}, {name: wall seconds})"""
+    results, keys, outputs, durations = {}, {}, {}, {}
+    waiting, running, printed = list(stages), {}, 0
+    router = _StdoutRouter(sys.stdout)
+    use_headless_backend()
+    
+    with contextlib.redirect_stdout(router), \
+            ThreadPoolExecutor(max_workers=workers or len(stages)) as pool:
+        while waiting or running:
+            for stage in [stage for stage in waiting
+                          if all(name in results for name in stage['inputs'])]:
+                waiting.remove(stage)
+                running[pool.submit(_run_stage, stage, results, keys, memo, trace, router)] = stage
+            if not running:
+                raise ValueError(f"stages with unmet inputs: {[stage['name'] for stage in waiting]}")
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)['name']
+                keys[name], results[name], outputs[name], durations[name] = future.result()
+            
+            # Console output follows declaration order, not completion order
+            while printed < len(stages) and stages[printed]['name'] in outputs:
+                router.stream.write(outputs[stages[printed]['name']])
+                printed += 1
+    
+    return results, durations
+
+
+def critical_path(stages, durations):
+    """Longest chain of dependent stages by wall time; returns (stage names, seconds)"""
+    finish, via = {}, {}
+    for stage in stages:
+        before = max(stage['inputs'], key=finish.get, default=None)
+        via[stage['name']] = before
+        finish[stage['name']] = durations[stage['name']] + (finish[before] if before else 0)
+    
+    name = max(finish, key=finish.get)
+    seconds = finish[name]
+    path = []
+    while name:
+        path.append(name)
+        name = via[name]
+    return path[::-1], round(seconds, 4)
+
+
+# ============================================================================
+# 23. WATCH MODE
+# ============================================================================
+
+# Polls the input files' size and mtime (no inotify or outside services) and
+# reruns the report once a burst of writes has been quiet for the debounce
+# period. Unchanged stages and partitions come back from the result cache and
+# the in-memory partition states, and every output file is renamed into place
+# only when complete.
+WATCH_DEBOUNCE_SECONDS = 3.0
+
+
+def watch_snapshot(data_path):
+    """(size, mtime) of every input file, keyed by path"""
+    snapshot = {}
+    for path in resolve_partitions(data_path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # removed between listing and stat
+        snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def watch(run, data_path, interval=2.0, debounce=WATCH_DEBOUNCE_SECONDS):
+    """Run the report now and again after every settled change to the input files"""
+    def attempt():
+        try:
+            run()
+        except Exception as error:
+            # Keep watching; the previous outputs stay in place and the next
+            # change (e.g. the writer finishing a half-written file) retries
+            print(f"\n❌ Report failed: {error}")
+    
+    snapshot = watch_snapshot(data_path)
+    try:
+        attempt()
+        print(f"\n👀 Watching {data_path} (polling every {interval:g}s, "
+              f"debounce {debounce:g}s; Ctrl+C to stop)")
+        
+        while True:
+            time.sleep(interval)
+            current = watch_snapshot(data_path)
+            if current == snapshot:
+                continue
+            
+            # Wait for the writer to finish: no further change for `debounce` seconds
+            quiet_since = time.monotonic()
+            while time.monotonic() - quiet_since < debounce:
+                time.sleep(min(interval, debounce))
+                latest = watch_snapshot(data_path)
+                if latest != current:
+                    current, quiet_since = latest, time.monotonic()
+            
+            changed = sorted(path for path in set(current) | set(snapshot)
+                             if current.get(path) != snapshot.get(path))
+            snapshot = current
+            print(f"\n🔄 {len(changed):,} input file(s) changed: "
+                  f"{', '.join(os.path.basename(path) for path in changed[:5])}"
+                  f"{', ...' if len(changed) > 5 else ''}")
+            attempt()
+            print(f"\n👀 Watching {data_path}")
+    except KeyboardInterrupt:
+        print("\n👋 Watch mode stopped")
+    return 0
+
+
+# ============================================================================
+# 24. TABLE EXPORT
+# ============================================================================
+
+# Every computed table is written to outputs/tables/ as one Arrow IPC file
+# (uncompressed, so readers can memory-map it) or Parquet file (zstd, smaller),
+# plus a manifest.json listing each file's schema and row count alongside the
+# KPIs and recommendations. Downstream jobs read the manifest and load only the
+# tables they need instead of rerunning the analysis. The manifest is renamed
+# into place last, so it never names a file that is not there yet; files the
+# previous manifest listed but this run did not write (e.g. the forecast when
+# history is too short) are removed after it.
+EXPORT_FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+EXPORT_MANIFEST = 'manifest.json'
+
+
+def export_frame(table):
+    """Series/DataFrame as a flat frame whose index becomes leading columns"""
+    frame = table.to_frame() if isinstance(table, pd.Series) else table
+    return frame.reset_index(drop=isinstance(frame.index, pd.RangeIndex))
+
+
+def export_tables(tables, export_dir, fmt='arrow', metadata=None):
+    """Write each table to `export_dir` in `fmt` and describe them in a manifest; returns its path"""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    
+    print("\n" + "="*70)
+    print("EXPORTING TABLES")
+    print("="*70)
+    
+    os.makedirs(export_dir, exist_ok=True)
+    metadata = metadata or {}
+    manifest_path = os.path.join(export_dir, EXPORT_MANIFEST)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f).get('tables', {})
+    entries = {}
+    for name, table in tables.items():
+        arrow_table = pa.Table.from_pandas(export_frame(table), preserve_index=False)
+        # The report metadata also travels inside each file's schema
+        arrow_table = arrow_table.replace_schema_metadata({
+            **(arrow_table.schema.metadata or {}),
+            b'sales_report': json.dumps({'table': name, **metadata}, default=_json_default).encode(),
+        })
+        filename = f'{name}{EXPORT_FORMATS[fmt]}'
+        with atomic_output(os.path.join(export_dir, filename)) as tmp_path:
+            if fmt == 'parquet':
+                pq.write_table(arrow_table, tmp_path, compression='zstd')
+            else:
+                feather.write_feather(arrow_table, tmp_path, compression='uncompressed')
+        entries[name] = {
+            'file': filename,
+            'rows': arrow_table.num_rows,
+            'bytes': os.path.getsize(os.path.join(export_dir, filename)),
+            'columns': {field.name: str(field.type) for field in arrow_table.schema},
+        }
+        print(f"   ✓ {filename}: {arrow_table.num_rows:,} rows × {arrow_table.num_columns} columns")
+    
+    with atomic_output(manifest_path) as tmp_path, open(tmp_path, 'w') as f:
+        json.dump({'format': fmt, **metadata, 'tables': entries}, f, indent=2, default=_json_default)
+    print(f"\n📦 {len(entries)} tables exported ({fmt}) with manifest: {manifest_path}")
+    
+    written = {entry['file'] for entry in entries.values()}
+    for entry in previous.values():
+        filename = os.path.basename(entry['file'])
+        if filename not in written and os.path.exists(os.path.join(export_dir, filename)):
+            os.remove(os.path.join(export_dir, filename))
+            print(f"   🗑️  Removed stale {filename}")
+    
+    return manifest_path
+
+
+# ============================================================================
+# 25. ROLLING WINDOWS & GROWTH
+# ============================================================================
+
+# Daily revenue and orders per Region (and per Category) are laid out as
+# zero-filled day × series matrices with running totals along the day axis.
+# Every trailing window of every series is then one subtraction of two shifted
+# cumulative rows, and monthly growth one reduceat over month boundaries; no
+# per-series loops. The panel is persisted between runs with a digest of each
+# day's cube rows: a later run keeps the prefix of days whose digest did not
+# change and re-aggregates and re-accumulates only from the first changed day,
+# so appending new days costs the new days rather than the whole history.
+ROLLING_WINDOWS = (7, 30, 90)
+GROWTH_DIMENSIONS = ['Region', 'Category']
+PANEL_MEASURES = {'Revenue': 'Revenue', 'Order_Count': 'Orders'}
+
+
+def _day_digests(cube, dates, dimension):
+    """Order-independent hash of each day's cube rows over `dimension` and the panel measures
+    
+    Unlike day totals, the digest changes when revenue or orders move between
+    series on the same day.
+    """
+    cells = cube[['Date', dimension] + list(PANEL_MEASURES)].dropna(subset=['Date'])
+    cells = cells.astype({measure: float for measure in PANEL_MEASURES}).round(6)
+    hashes = pd.util.hash_pandas_object(cells.drop(columns='Date'), index=False).to_numpy()
+    digests = np.zeros(len(dates), dtype=np.uint64)
+    np.add.at(digests, (cells['Date'] - dates[0]).dt.days.to_numpy(), hashes)
+    return digests
+
+
+def _first_changed_day(previous, dates, digests):
+    """Index of the first day whose digest differs from the previous panel's"""
+    if previous is None or 'digests' not in previous or previous['dates'][0] != dates[0]:
+        return 0
+    n = min(len(previous['dates']), len(dates))
+    changed = previous['digests'][:n] != digests[:n]
+    return int(np.argmax(changed)) if changed.any() else n
+
+
+def build_panel(cube, dimension, previous=None):
+    """Daily revenue/order matrices per value of `dimension`, with running totals
+    
+    Days before the first one whose cube rows differ from `previous` (the panel
+    of an earlier run) are copied rather than re-aggregated.
+    """
+    dates = pd.date_range(cube['Date'].min(), cube['Date'].max(), freq='D')
+    series = pd.Index(sorted(cube[dimension].dropna().unique()), name=dimension)
+    digests = _day_digests(cube, dates, dimension)
+    
+    start = _first_changed_day(previous, dates, digests)
+    if start and not previous['series'].isin(series).all():
+        start = 0
+    kept_columns = series.get_indexer(previous['series']) if start else None
+    
+    # Only the changed tail of the cube is rolled up to (series, day) cells
+    tail = rollup_cube(cube[cube['Date'] >= dates[start]], [dimension, 'Date']) \
+        if start < len(dates) else None
+    if tail is not None:
+        tail = tail[list(PANEL_MEASURES)].reset_index()
+        rows = (tail['Date'] - dates[0]).dt.days.to_numpy()
+        columns = series.get_indexer(tail[dimension])
+    
+    daily, cumulative = {}, {}
+    for measure in PANEL_MEASURES:
+        matrix = np.zeros((len(dates), len(series)))
+        running = np.zeros((len(dates) + 1, len(series)))
+        if start:
+            matrix[:start, kept_columns] = previous['daily'][measure][:start]
+            running[:start + 1, kept_columns] = previous['cumulative'][measure][:start + 1]
+        if tail is not None:
+            matrix[rows, columns] = tail[measure].to_numpy(dtype=float)
+            running[start + 1:] = running[start] + np.cumsum(matrix[start:], axis=0)
+        daily[measure], cumulative[measure] = matrix, running
+    
+    return {'dates': dates, 'series': series, 'daily': daily, 'cumulative': cumulative,
+            'digests': digests, 'reused_days': start}
+
+
+def rolling_sums(panel, window):
+    """Trailing `window`-day totals for every day and series (NaN until the window is full)"""
+    sums = {}
+    for measure, running in panel['cumulative'].items():
+        trailing = np.full(running[1:].shape, np.nan)
+        trailing[window - 1:] = running[window:] - running[:-window]
+        sums[measure] = trailing
+    return sums
+
+
+def monthly_growth(panel):
+    """Revenue per complete calendar month with MoM and YoY growth, per series"""
+    dates = panel['dates']
+    months = dates.to_numpy().astype('datetime64[M]')
+    starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    revenue = np.add.reduceat(panel['daily']['Revenue'], starts, axis=0)
+    labels = pd.PeriodIndex(months[starts], freq='M')
+    
+    # Partial months at either end would distort the comparison
+    first = 0 if dates[0].is_month_start else 1
+    last = len(starts) if dates[-1].is_month_end else len(starts) - 1
+    revenue, labels = revenue[first:last], labels[first:last]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mom = np.full(revenue.shape, np.nan)
+        mom[1:] = revenue[1:] / revenue[:-1] - 1
+        yoy = np.full(revenue.shape, np.nan)
+        yoy[12:] = revenue[12:] / revenue[:-12] - 1
+    mom[~np.isfinite(mom)] = np.nan
+    yoy[~np.isfinite(yoy)] = np.nan
+    return labels, revenue, mom, yoy
+
+
+def growth_snapshot(panel):
+    """Latest trailing-window totals and latest complete month's growth, one row per series"""
+    snapshot = pd.DataFrame(index=panel['series'])
+    for window in ROLLING_WINDOWS:
+        sums = rolling_sums(panel, window)
+        for measure, label in PANEL_MEASURES.items():
+            snapshot[f'{label}_{window}d'] = sums[measure][-1]
+    labels, _, mom, yoy = monthly_growth(panel)
+    snapshot['MoM_%'] = mom[-1] * 100 if len(labels) else np.nan
+    snapshot['YoY_%'] = yoy[-1] * 100 if len(labels) else np.nan
+    snapshot.attrs['as_of'] = panel['dates'][-1].date().isoformat()
+    snapshot.attrs['month'] = str(labels[-1]) if len(labels) else None
+    return snapshot
+
+
+def analyze_rolling_growth(cube, state_path=None, dimensions=GROWTH_DIMENSIONS):
+    """Trailing 7/30/90-day revenue and orders plus MoM/YoY growth per Region and Category"""
+    print("\n" + "="*70)
+    print("ROLLING WINDOWS & GROWTH")
+    print("="*70)
+    
+    previous = pd.read_pickle(state_path) if state_path and os.path.exists(state_path) else {}
+    panels, snapshots = {}, {}
+    for dimension in dimensions:
+        panels[dimension] = build_panel(cube, dimension, previous.get(dimension))
+        snapshots[dimension] = growth_snapshot(panels[dimension])
+    
+    panel = panels[dimensions[0]]
+    if panel['reused_days']:
+        print(f"\n♻️  {panel['reused_days']:,} of {len(panel['dates']):,} days reused from the previous run")
+    
+    for dimension, snapshot in snapshots.items():
+        month = snapshot.attrs['month'] or 'no complete month'
+        print(f"\n📈 Trailing Revenue and Growth by {dimension} "
+              f"(as of {snapshot.attrs['as_of']}; growth for {month}):")
+        print(snapshot.filter(regex='^Revenue_|_%$').round(2))
+        print(f"\n🧾 Trailing Orders by {dimension}:")
+        print(snapshot.filter(regex='^Orders_').astype('Int64'))
+    
+    if state_path:
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        with atomic_output(state_path) as tmp_path:
+            pd.to_pickle(panels, tmp_path)
+    
+    return snapshots
+
+
+# ============================================================================
+# 26. DEMAND FORECASTING
+# ============================================================================
+
+# Monthly revenue of every Product × Region series is laid out as one
+# series × month matrix, and each model is fitted to all rows at once: the
+# smoothing recursions loop over months (a few dozen steps) with every step a
+# vector operation across all series, never a loop over series. Candidates are
+# seasonal-naive and additive seasonal exponential smoothing over a small
+# grid of smoothing weights; each series keeps the candidate with the lowest
+# one-step-ahead mean absolute error over the months after the first season.
+FORECAST_HORIZON = 3
+FORECAST_SERIES = ['Product', 'Region']
+SEASON_LENGTH = 12
+SMOOTHING_LEVELS = (0.1, 0.3, 0.5, 0.8)
+SMOOTHING_SEASONALS = (0.1, 0.3)
+
+
+def monthly_matrix(cube, keys=FORECAST_SERIES):
+    """Revenue per series (rows) and complete calendar month (columns); returns (matrix, series, months)
+    
+    Keys are factorized rather than read through `.cat`, since cubes merged
+    from chunks or partitions with different category sets come back as
+    object columns. Rows without a date or key are left out.
+    """
+    factorized = [pd.factorize(cube[key]) for key in keys]
+    codes = [code for code, _ in factorized]
+    shape = [max(len(uniques), 1) for _, uniques in factorized]
+    dates = cube['Date']
+    keep = np.all([code >= 0 for code in codes], axis=0) & dates.notna().to_numpy()
+    if not keep.any():
+        return np.zeros((0, 0)), pd.MultiIndex.from_arrays([[]] * len(keys), names=keys), \
+            pd.PeriodIndex([], freq='M')
+    
+    dates = dates[keep]
+    months = dates.to_numpy().astype('datetime64[M]')
+    
+    # Only series that actually occur get a row
+    series_codes, rows = np.unique(np.ravel_multi_index([code[keep] for code in codes], shape),
+                                   return_inverse=True)
+    first = months.min()
+    columns = (months - first).astype(np.int64)
+    n_months = int((months.max() - first).astype(np.int64)) + 1
+    matrix = np.bincount(rows * n_months + columns,
+                         weights=cube['Revenue'].to_numpy(dtype=float)[keep],
+                         minlength=len(series_codes) * n_months).reshape(len(series_codes), n_months)
+    labels = pd.period_range(pd.Period(first, freq='M'), periods=n_months, freq='M')
+    
+    # Partial months at either end would look like a collapse in demand
+    start = 0 if dates.min().is_month_start else 1
+    stop = n_months if dates.max().is_month_end else n_months - 1
+    
+    series = pd.MultiIndex.from_arrays(
+        [uniques.take(level)
+         for (_, uniques), level in zip(factorized, np.unravel_index(series_codes, shape))],
+        names=keys)
+    return matrix[:, start:max(start, stop)], series, labels[start:max(start, stop)]
+
+
+def seasonal_naive(history, horizon, season=SEASON_LENGTH):
+    """Each month ahead repeats the same month one season earlier; returns (forecasts, one-step MAE)"""
+    steps = len(history) - season + np.arange(horizon) % season
+    return history[steps], np.abs(history[season:] - history[:-season]).mean(axis=0)
+
+
+def seasonal_smoothing(history, horizon, alpha, gamma, season=SEASON_LENGTH):
+    """Additive seasonal exponential smoothing of every series at once; returns (forecasts, one-step MAE)"""
+    level = history[:season].mean(axis=0)
+    seasonal = history[:season] - level
+    abs_error = np.zeros_like(level)
+    for t in range(season, len(history)):
+        index = seasonal[t % season]
+        abs_error += np.abs(history[t] - level - index)
+        new_level = alpha * (history[t] - index) + (1 - alpha) * level
+        seasonal[t % season] = gamma * (history[t] - new_level) + (1 - gamma) * index
+        level = new_level
+    steps = (len(history) + np.arange(horizon)) % season
+    return level + seasonal[steps], abs_error / (len(history) - season)
+
+
+def simple_smoothing(history, horizon, alpha):
+    """Level-only exponential smoothing for histories shorter than a season"""
+    level = history[0].copy()
+    abs_error = np.zeros_like(level)
+    for t in range(1, len(history)):
+        abs_error += np.abs(history[t] - level)
+        level = alpha * history[t] + (1 - alpha) * level
+    return np.repeat(level[None], horizon, axis=0), abs_error / (len(history) - 1)
+
+
+def batch_forecast(y, horizon=FORECAST_HORIZON):
+    """Fit every candidate model to all series and keep the best per series; returns (forecasts, model names)"""
+    # Time-major copy: each step of the recursions reads one contiguous row
+    history = np.ascontiguousarray(y.T, dtype=float)
+    if len(history) > SEASON_LENGTH:
+        candidates = [('seasonal naive', functools.partial(seasonal_naive, history, horizon))]
+        candidates += [(f'seasonal smoothing (α={alpha:g}, γ={gamma:g})',
+                        functools.partial(seasonal_smoothing, history, horizon, alpha, gamma))
+                       for alpha in SMOOTHING_LEVELS for gamma in SMOOTHING_SEASONALS]
+    elif len(history) > 1:
+        candidates = [(f'simple smoothing (α={alpha:g})',
+                       functools.partial(simple_smoothing, history, horizon, alpha))
+                      for alpha in SMOOTHING_LEVELS]
+    else:
+        raise ValueError("forecasting needs at least two complete months of data")
+    
+    # Keep a running best so memory stays at a few rows per series
+    names = np.array([name for name, _ in candidates])
+    best_forecast, best_mae = candidates[0][1]()
+    best = np.zeros(y.shape[0], dtype=np.int64)
+    for number, (_, fit) in enumerate(candidates[1:], 1):
+        forecast, mae = fit()
+        better = mae < best_mae
+        best_forecast[:, better] = forecast[:, better]
+        best_mae[better] = mae[better]
+        best[better] = number
+    return np.clip(best_forecast.T, 0, None), names[best]
+
+
+def forecast_outlook(forecast):
+    """(product, region, formatted change) of the series gaining most on last year, or None"""
+    if forecast['series']['Change'].isna().all():
+        return None
+    outlook = top_n_rows(forecast['series'], 'Change', 1)
+    (product, region), change = outlook.index[0], outlook.iloc[0]['Change']
+    return product, region, f"{'+' if change >= 0 else '-'}${abs(change):,.2f}"
+
+
+def forecast_revenue(cube, horizon=FORECAST_HORIZON):
+    """Revenue forecast for the next `horizon` months of every Product × Region series"""
+    print("\n" + "="*70)
+    print(f"DEMAND FORECAST (NEXT {horizon} MONTHS)")
+    print("="*70)
+    
+    y, series, months = monthly_matrix(cube)
+    if len(months) < 2:
+        print(f"\n⚠️  Forecast skipped: needs at least two complete months of history "
+              f"(found {len(months)})")
+        return None
+    forecasts, models = batch_forecast(y, horizon)
+    future = pd.period_range(months[-1] + 1, periods=horizon, freq='M')
+    
+    table = pd.DataFrame(forecasts, index=series, columns=[str(month) for month in future])
+    table['Forecast_Total'] = forecasts.sum(axis=1)
+    # Same calendar months one year earlier, where the history reaches back that far
+    last_year = (y[:, len(months) - 12 + np.arange(horizon)] if len(months) >= 12
+                 else np.full_like(forecasts, np.nan))
+    table['Last_Year'] = last_year.sum(axis=1)
+    table['Change'] = table['Forecast_Total'] - table['Last_Year']
+    table['Model'] = models
+    
+    monthly = pd.DataFrame({'Forecast': forecasts.sum(axis=0), 'Last_Year': last_year.sum(axis=0)},
+                           index=pd.Index([str(month) for month in future], name='Month'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        monthly['Change_%'] = (monthly['Forecast'] / monthly['Last_Year'] - 1) * 100
+    
+    print(f"\n🔮 {len(series):,} series fitted on {len(months)} complete months "
+          f"({months[0]} to {months[-1]})")
+    print(f"\n📅 Forecast Revenue by Month:")
+    print(monthly.round(2))
+    
+    by_region = table.groupby(level='Region', observed=True)[
+        ['Forecast_Total', 'Last_Year', 'Change']].sum(min_count=1)
+    print(f"\n🌍 Forecast by Region (next {horizon} months):")
+    print(top_n_rows(by_region, 'Forecast_Total', len(by_region)).round(2))
+    
+    if table['Change'].notna().any():
+        print(f"\n🚀 Strongest Product × Region Outlook (vs same months last year):")
+        print(top_n_rows(table, 'Change', 5)[['Forecast_Total', 'Last_Year', 'Change']].round(2))
+    else:
+        print(f"\n🚀 Largest Product × Region Forecasts (under a year of history to compare):")
+        print(top_n_rows(table, 'Forecast_Total', 5)[['Forecast_Total']].round(2))
+    
+    model_mix = pd.Series(models).str.split(' \\(').str[0].value_counts()
+    print(f"\n🧮 Models chosen: " + ", ".join(f"{name} × {count:,}" for name, count in model_mix.items()))
+    
+    return {'series': table, 'monthly': monthly}
+
+
 # ============================================================================
 # MAIN EXECUTION
 # ============================================================================
 
-def main():
+def load_cube(args, data_path, cache_dir, validation_path=None):
+    """Load the dataset per the command-line mode; returns (cube, row-level frame or sample)"""
+    partitions = resolve_partitions(data_path)
+    if args.approx:
+        return load_sample(partitions, args.approx, jobs=args.jobs,
+                           date_from=args.date_from, date_to=args.date_to)
+    if len(partitions) > 1 or data_path != partitions[0] or args.date_from or args.date_to:
+        return load_partitions(partitions, jobs=args.jobs, chunksize=args.chunksize,
+                               date_from=args.date_from, date_to=args.date_to,
+                               validation_path=validation_path)
+    if args.incremental:
+        return load_incremental(data_path,
+                                _cache_table_dir(data_path, os.path.join(cache_dir, 'incremental')),
+                                chunksize=args.chunksize, rebuild=args.rebuild,
+                                validation_path=validation_path)
+    if args.stream:
+        return stream_and_inspect_data(data_path, chunksize=args.chunksize,
+                                       validation_path=validation_path)
+    df = load_and_inspect_data(data_path, cache_dir=None if args.no_cache else cache_dir,
+                               validation_path=validation_path)
+    return build_sales_cube(df), df
+
+
+def _json_default(value):
+    """JSON encoder fallback for numpy scalars and timestamps"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def table_records(table):
+    """Flatten a Series/DataFrame (index included) into JSON-ready records"""
+    frame = table.to_frame() if isinstance(table, pd.Series) else table
+    frame = frame.reset_index(drop=isinstance(frame.index, pd.RangeIndex))
+    return json.loads(frame.to_json(orient='records', date_format='iso'))
+
+
+REPORT_TABLES = ['product_revenue', 'regional_metrics', 'monthly_revenue', 'seasonal_pattern',
+                 'segment_revenue', 'channel_revenue', 'category_metrics']
+
+
+def report_tables(product_revenue, regional_metrics, monthly_revenue, seasonal_pattern,
+                  segment_revenue, channel_revenue, category_metrics):
+    """The report's aggregate tables by name, as exported to JSON, Arrow or Parquet"""
+    return dict(zip(REPORT_TABLES, [
+        top_n_rows(product_revenue, 'Total_Revenue', len(product_revenue)),
+        regional_metrics,
+        monthly_revenue,
+        seasonal_pattern.rename('Avg_Revenue'),
+        segment_revenue,
+        channel_revenue,
+        category_metrics,
+    ]))
+
+
+def collect_metrics(args, data_path, cache_dir):
+    """Compute KPIs and aggregate tables without rendering any figure"""
+    cube, rows = load_cube(args, data_path, cache_dir)
+    kpis = calculate_kpis(cube)
+    product_revenue = analyze_top_products(cube, None, render=skip_render)
+    regional_metrics = analyze_regions(cube, None, render=skip_render)
+    monthly_revenue, seasonal_pattern = analyze_seasonality(cube, None, render=skip_render)
+    segment_revenue, channel_revenue, category_metrics = additional_insights(
+        None, cube, None, render=skip_render
+    )
+    
+    tables = report_tables(product_revenue, regional_metrics, monthly_revenue, seasonal_pattern,
+                           segment_revenue, channel_revenue, category_metrics)
+    metrics = {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'source': data_path,
+        'kpis': kpis,
+        'tables': {name: table_records(table) for name, table in tables.items()},
+    }
+    if args.approx:
+        estimates = approximate_kpis(rows, args.approx)
+        for name in ['order_value_percentiles', 'seasonal_pattern']:
+            estimates[name] = table_records(estimates[name])
+        metrics['estimates'] = estimates
+    return metrics
+
+
+def parse_args(argv=None):
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description="Retail sales analysis report")
+    parser.add_argument('--data', metavar='PATH',
+                        help="CSV file, directory of CSVs or glob of partitions "
+                             "(default: data/retail_sales_data.csv)")
+    parser.add_argument('--date-from', metavar='DATE',
+                        help="first date (or YYYY-MM month) to include; prunes partitions by file name")
+    parser.add_argument('--date-to', metavar='DATE',
+                        help="last date (or YYYY-MM month) to include; prunes partitions by file name")
+    parser.add_argument('--stream', action='store_true',
+                        help="read the CSV in bounded chunks (memory does not grow with row count, "
+                             "apart from 8 bytes per distinct Order_ID for duplicate checks)")
+    parser.add_argument('--approx', type=float, metavar='FRACTION',
+                        help="read only a random FRACTION of rows (e.g. 0.05) and report "
+                             "estimates with 95%% confidence intervals")
+    parser.add_argument('--chunksize', type=int, default=500_000,
+                        help="rows per chunk in streaming mode (default: 500,000)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="fold only rows added since the last run into persisted aggregates")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="discard persisted incremental state and rebuild it from the full file")
+    parser.add_argument('--metrics-only', action='store_true',
+                        help="skip charts and PDF; print KPIs and tables as JSON on stdout")
+    parser.add_argument('--profile', action='store_true',
+                        help="record wall/CPU time, memory and rows per stage; write a JSON trace "
+                             "(tracemalloc slows allocation-heavy stages)")
+    parser.add_argument('--profile-stage', metavar='STAGE',
+                        help="also capture cProfile stats for one stage (e.g. load, products)")
+    parser.add_argument('--serve', action='store_true',
+                        help="load once and answer KPI/product/region/seasonality queries over local HTTP")
+    parser.add_argument('--port', type=int, default=8765,
+                        help="port for --serve (default: 8765)")
+    parser.add_argument('--watch', type=float, nargs='?', const=2.0, metavar='SECONDS',
+                        help="keep running and regenerate the report when the input files "
+                             "change, polling every SECONDS (default: 2)")
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE_SECONDS,
+                        help="with --watch, wait until the input has been unchanged this "
+                             f"many seconds before rerunning (default: {WATCH_DEBOUNCE_SECONDS:g})")
+    parser.add_argument('--stages', nargs='+', choices=PIPELINE_STAGES, metavar='STAGE',
+                        help="run only these stages and the ones they depend on "
+                             f"({', '.join(PIPELINE_STAGES)})")
+    parser.add_argument('--export', nargs='?', const='arrow', choices=list(EXPORT_FORMATS),
+                        metavar='FORMAT',
+                        help="also write every table to outputs/tables/ as Arrow IPC ('arrow', the "
+                             "default) or Parquet files with a JSON manifest (needs pyarrow)")
+    parser.add_argument('--batch-by', nargs='+', choices=BATCH_DIMENSIONS, metavar='DIMENSION',
+                        help="also write one report per value of these dimensions "
+                             f"({', '.join(BATCH_DIMENSIONS)}) to outputs/segments/")
+    parser.add_argument('--top-n', type=int, default=10,
+                        help="number of products in the top products charts (default: 10)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="re-parse the CSV and recompute every stage instead of using "
+                             "the column and stage result caches")
+    parser.add_argument('--backend', choices=['pandas'] + list(AGGREGATION_BACKENDS),
+                        default='pandas',
+                        help="engine that aggregates raw rows into the cube; polars and duckdb "
+                             "use every core (default: pandas)")
+    parser.add_argument('--render-profile', choices=list(RENDER_PROFILES), default='publication',
+                        help="'publication' saves charts at 300 dpi with a tight layout; 'preview' "
+                             "saves at 72 dpi with a fixed layout, several times faster")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes for chart rendering and partition reading "
+                             "(default: 1, run inline)")
+    args = parser.parse_args(argv)
+    if args.approx is not None and not 0 < args.approx <= 1:
+        parser.error("--approx must be a fraction in (0, 1]")
+    if args.watch is not None and args.watch <= 0:
+        parser.error("--watch interval must be positive")
+    if args.stages and 'approx' in args.stages and args.approx is None:
+        parser.error("--stages approx needs --approx")
+    if args.stages and 'export' in args.stages and args.export is None:
+        parser.error("--stages export needs --export")
+    if args.export and importlib.util.find_spec('pyarrow') is None:
+        parser.error("--export needs the 'pyarrow' package (pip install pyarrow)")
+    if args.backend != 'pandas' and importlib.util.find_spec(args.backend) is None:
+        parser.error(f"--backend {args.backend} needs the '{args.backend}' package "
+                     f"(pip install {args.backend})")
+    return args
+
+
+def main(argv=None):
     """Main execution function"""
     
-    import os
+    args = parse_args(argv)
+    use_backend(args.backend)
+    use_render_profile(args.render_profile)
     
     # Get the directory where the script is located
     script_dir = os.path.dirname(os.path.abspath(__file__))
     
     # Define paths relative to script location
-    data_path = os.path.join(script_dir, 'data', 'retail_sales_data.csv')
+    data_path = args.data or os.path.join(script_dir, 'data', 'retail_sales_data.csv')
     viz_path = os.path.join(script_dir, 'visualizations')
     output_path = os.path.join(script_dir, 'outputs')
+    cache_dir = os.path.join(script_dir, 'cache')
+    
+    # Headless probe: progress goes to stderr, JSON to stdout
+    if args.metrics_only:
+        if not resolve_partitions(data_path):
+            print(f"❌ ERROR: Data file not found: {data_path}", file=sys.stderr)
+            return 1
+        with contextlib.redirect_stdout(sys.stderr):
+            metrics = collect_metrics(args, data_path, cache_dir)
+        print(json.dumps(metrics, default=_json_default, indent=2))
+        return 0
+    
+    # Long-running server: keep the cube warm and answer queries
+    if args.serve:
+        if not resolve_partitions(data_path):
+            print(f"❌ ERROR: Data file not found: {data_path}")
+            return 1
+        cube, _ = load_cube(args, data_path, cache_dir)
+        serve(cube, port=args.port)
+        return 0
+    
+    # Long-running watcher: regenerate the report whenever the data changes
+    if args.watch is not None:
+        keep_partition_states()
+        return watch(lambda: run_report(args, script_dir, data_path, viz_path, output_path, cache_dir),
+                     data_path, interval=args.watch, debounce=args.debounce)
+    
+    return run_report(args, script_dir, data_path, viz_path, output_path, cache_dir)
+
+
+def run_report(args, script_dir, data_path, viz_path, output_path, cache_dir):
+    """Generate the full report: console analysis, charts and PDF"""
     
     # Create directories if they don't exist
     print("\n📊 Starting Retail Sales Analysis...")
@@ -621,7 +3304,7 @@ def main():
             print(f"   ✓ Found: {path}")
     
     # Check if data file exists
-    if not os.path.exists(data_path):
+    if not resolve_partitions(data_path):
         print(f"\n❌ ERROR: Data file not found!")
         print(f"   Looking for: {data_path}")
         print(f"\n📁 Please ensure 'retail_sales_data.csv' is in the 'data' folder")
@@ -638,41 +3321,173 @@ def main():
     print(f"   Visualizations: {viz_path}")
     print(f"   Outputs: {output_path}")
     
-    # 1. Load data
-    df = load_and_inspect_data(data_path)
-    
-    # 2. Calculate KPIs
-    kpis = calculate_kpis(df)
-    
-    # 3. Analyze top products
-    product_revenue = analyze_top_products(df, viz_path)
-    
-    # 4. Regional analysis
-    regional_metrics = analyze_regions(df, viz_path)
-    
-    # 5. Seasonality & trends
-    monthly_revenue, seasonal_pattern = analyze_seasonality(df, viz_path)
-    
-    # 6. Additional insights
-    segment_revenue, channel_revenue, category_metrics = additional_insights(df, viz_path)
-    
-    # 7. Generate recommendations
-    recommendations = generate_recommendations(df, kpis, product_revenue, 
-                                               regional_metrics, seasonal_pattern)
-    
-    # 8. Create PDF summary
-    pdf_file = create_summary_pdf(kpis, product_revenue, regional_metrics, 
-                                   seasonal_pattern, recommendations, 
-                                   output_path, viz_path)
+    trace = new_trace(args.profile or bool(args.profile_stage), args.profile_stage)
+    
+    # Stage results are reused while the input data, parameters and code are
+    # unchanged; the dataset itself is only loaded when some stage needs it
+    memo = None if args.no_cache else new_result_cache(os.path.join(cache_dir, 'results'))
+    load_params = {
+        'data': data_fingerprint(resolve_partitions(data_path), cache_dir) if memo else None,
+        'stream': args.stream,
+        'incremental': args.incremental,
+        'approx': args.approx,
+        'date_from': args.date_from,
+        'date_to': args.date_to,
+    }
+    validation_path = os.path.join(output_path, 'validation_report.json')
+    loaded = {}
+    load_lock = threading.Lock()
+    
+    def load():
+        with load_lock:
+            if not loaded:
+                loaded['cube'], loaded['df'] = load_cube(args, data_path, cache_dir, validation_path)
+        return loaded
+    
+    def cube_cells(result, cube, *inputs):
+        return len(cube)
+    
+    # Charts are rendered inline, or handed to worker processes once each
+    # stage has computed its tables
+    pool = worker_pool(args.jobs, initializer=use_render_profile,
+                       initargs=(args.render_profile,)) if args.jobs > 1 else None
+    render_futures = []
+    render = functools.partial(submit_render, pool, render_futures) if pool else render_inline
+    
+    def chart(filename):
+        return [os.path.join(viz_path, filename)]
+    
+    # Rolling panels persist per data source and filter, unless caching is off
+    rolling_key = json.dumps([os.path.abspath(data_path), args.date_from, args.date_to, args.approx])
+    rolling_path = None if args.no_cache else os.path.join(
+        cache_dir, 'rolling', f'{hashlib.sha256(rolling_key.encode()).hexdigest()[:16]}.pkl')
+    
+    stages = [
+        # 1. Load data and aggregate once; every stage below reads from the cube
+        pipeline_stage('load', lambda: load()['cube'], params=load_params,
+                       files=[] if args.approx else [validation_path],
+                       rows=lambda cube: int(cube['Row_Count'].sum())),
+        # 2. Calculate KPIs
+        pipeline_stage('kpis', calculate_kpis, inputs=['load'], rows=cube_cells),
+        # 2b. Confidence intervals for the sampled estimates
+        pipeline_stage('approx', lambda cube: approximate_kpis(load()['df'], args.approx),
+                       inputs=['load'], rows=lambda result, cube: len(loaded['df']) if loaded else None),
+        # 3. Analyze top products
+        pipeline_stage('products',
+                       lambda cube: analyze_top_products(cube, viz_path, top_n=args.top_n, render=render),
+                       inputs=['load'], params={'top_n': args.top_n, 'render': args.render_profile},
+                       files=chart('top_products_analysis.png'), rows=cube_cells),
+        # 4. Regional analysis
+        pipeline_stage('regions', lambda cube: analyze_regions(cube, viz_path, render=render),
+                       inputs=['load'], params={'render': args.render_profile},
+                       files=chart('regional_analysis.png'), rows=cube_cells),
+        # 5. Seasonality & trends
+        pipeline_stage('seasonality', lambda cube: analyze_seasonality(cube, viz_path, render=render),
+                       inputs=['load'], params={'render': args.render_profile},
+                       files=chart('seasonality_trends.png'), rows=cube_cells),
+        # 5b. Trailing windows and growth, extending the previous run's panels
+        pipeline_stage('rolling', lambda cube: analyze_rolling_growth(cube, rolling_path),
+                       inputs=['load'], rows=cube_cells),
+        # 6. Additional insights (the only stage that needs row-level data)
+        pipeline_stage('insights',
+                       lambda cube: additional_insights(load()['df'], cube, viz_path, render=render),
+                       inputs=['load'], params={'render': args.render_profile},
+                       files=chart('additional_insights.png'), rows=cube_cells),
+        # 6b. Revenue forecast for every Product × Region series
+        pipeline_stage('forecast', forecast_revenue, inputs=['load'], rows=cube_cells),
+        # 7. Generate recommendations
+        pipeline_stage('recommendations',
+                       lambda cube, kpis, products, regions, seasonality, forecast:
+                           generate_recommendations(cube, kpis, products, regions, seasonality[1],
+                                                    forecast),
+                       inputs=['load', 'kpis', 'products', 'regions', 'seasonality', 'forecast']),
+        # 8. Create PDF summary (dated, so it is rebuilt at most once a day)
+        pipeline_stage('pdf',
+                       lambda kpis, products, regions, seasonality, forecast, recommendations:
+                           create_summary_pdf(kpis, products, regions, seasonality[1],
+                                              recommendations, output_path, viz_path, forecast),
+                       inputs=['kpis', 'products', 'regions', 'seasonality', 'forecast',
+                               'recommendations'],
+                       params={'date': datetime.now().date().isoformat()},
+                       files=[os.path.join(output_path, 'Sales_Analysis_Summary.pdf')]),
+    ]
     
+    # 10. Export every table, with a manifest, for downstream jobs
+    if args.export:
+        export_dir = os.path.join(output_path, 'tables')
+        export_inputs = ['kpis', 'products', 'regions', 'seasonality', 'insights', 'recommendations',
+                         'rolling', 'forecast']
+        export_names = list(REPORT_TABLES) + [f'rolling_{dimension.lower()}'
+                                              for dimension in GROWTH_DIMENSIONS]
+        export_names += ['forecast_series', 'forecast_monthly']
+        if args.approx:
+            export_inputs.append('approx')
+            export_names += ['approx_order_value_percentiles', 'approx_seasonal_pattern']
+        
+        def export(kpis, products, regions, seasonality, insights, recommendations, rolling,
+                   forecast, estimates=None):
+            tables = report_tables(products, regions, *seasonality, *insights)
+            for dimension, snapshot in rolling.items():
+                tables[f'rolling_{dimension.lower()}'] = snapshot
+            if forecast is not None:
+                tables['forecast_series'] = forecast['series']
+                tables['forecast_monthly'] = forecast['monthly']
+            metadata = {
+                'generated': datetime.now().isoformat(timespec='seconds'),
+                'source': data_path,
+                'data_sha256': load_params['data'] or data_fingerprint(resolve_partitions(data_path)),
+                'date_from': args.date_from,
+                'date_to': args.date_to,
+                'kpis': kpis,
+                'recommendations': recommendations,
+            }
+            if estimates:
+                tables['approx_order_value_percentiles'] = estimates['order_value_percentiles']
+                tables['approx_seasonal_pattern'] = estimates['seasonal_pattern']
+                metadata['estimates'] = {key: estimates[key] for key in ['fraction', 'sampled_rows', 'kpis']}
+            return export_tables(tables, export_dir, args.export, metadata)
+        
+        stages.append(pipeline_stage(
+            'export', export, inputs=export_inputs, params={'format': args.export},
+            files=[os.path.join(export_dir, f'{name}{EXPORT_FORMATS[args.export]}') for name in export_names]
+                  + [os.path.join(export_dir, EXPORT_MANIFEST)]))
+    
+    stages = select_stages([stage for stage in stages if args.approx or stage['name'] != 'approx'],
+                           args.stages)
+    
+    # Profiled runs go one stage at a time so that CPU and memory stay attributable
+    results, durations = run_pipeline(stages, trace, memo, workers=1 if trace['enabled'] else None)
+    trace['critical_path'] = critical_path(stages, durations)
+    
+    # Wait for the chart workers, surfacing any rendering error
+    if pool:
+        with traced_stage(trace, 'render_wait'):
+            for future in render_futures:
+                future.result()
+            pool.shutdown()
+    
+    commit_memoized(memo)
+    
+    # 9. One report per segment, sharing the loaded dataset
+    if args.batch_by:
+        cube = results['load']
+        with traced_stage(trace, 'batch') as stage:
+            run_batch(cube, load()['df'], args.batch_by, os.path.join(output_path, 'segments'),
+                      jobs=args.jobs, top_n=args.top_n)
+            stage['rows'] = len(cube)
+    
+    report_trace(trace, os.path.join(output_path, 'profile_trace.json'))
+    
+    charts = [path for stage in stages for path in stage['files'] if path.endswith('.png')]
     print("\n" + "="*70)
     print("✅ ANALYSIS COMPLETE!")
     print("="*70)
-    print(f"\n📊 Total visualizations created: 4")
-    print(f"📄 PDF summary generated: Sales_Analysis_Summary.pdf")
+    print(f"\n📊 Total visualizations created: {len(charts)}")
+    if 'pdf' in results:
+        print(f"📄 PDF summary generated: Sales_Analysis_Summary.pdf")
     print(f"\n💡 Check the 'visualizations' and 'outputs' folders for results!")
     print("\n" + "="*70)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import salesanalysis as sa
+
+FRACTION = 0.05
+SEEDS = 200
+
+
+@pytest.fixture(scope='module')
+def population():
+    """Orders whose price level differs strongly between Region × Category strata"""
+    rng = np.random.default_rng(2024)
+    n = 40_000
+    region = rng.choice(['North', 'South', 'East', 'West'], n, p=[0.4, 0.3, 0.2, 0.1])
+    category = rng.choice(['Computers', 'Accessories', 'Audio'], n, p=[0.2, 0.5, 0.3])
+    level = (pd.Series(category).map({'Computers': 900.0, 'Accessories': 30.0, 'Audio': 150.0})
+             * pd.Series(region).map({'North': 1.0, 'South': 0.8, 'East': 1.3, 'West': 0.6})).to_numpy()
+    unit_price = level * rng.lognormal(0, 0.3, n)
+    quantity = rng.integers(1, 6, n)
+    return pd.DataFrame({
+        'Region': pd.Categorical(region),
+        'Category': pd.Categorical(category),
+        'Unit_Price': unit_price,
+        'Quantity': quantity,
+        'Revenue': unit_price * quantity,
+    })
+
+
+def coverage(population, estimator, truth):
+    """Share of seeded Bernoulli samples whose 95% CI contains `truth`"""
+    hits = 0
+    for seed in range(SEEDS):
+        keep = np.random.default_rng([seed, 1]).random(len(population)) < FRACTION
+        estimate, half_width = estimator(population[keep])
+        hits += abs(estimate - truth) <= half_width
+    return hits / SEEDS
+
+
+@pytest.mark.parametrize('column', ['Unit_Price', 'Revenue', 'Quantity'])
+def test_mean_ci_covers_population_mean(population, column):
+    rate = coverage(population, lambda s: sa.sample_mean(s, column, FRACTION),
+                    population[column].mean())
+    assert rate >= 0.9
+
+
+def test_ratio_ci_covers_population_ratio(population):
+    truth = population['Revenue'].sum() / population['Quantity'].sum()
+    rate = coverage(population, lambda s: sa.sample_ratio(s, 'Revenue', 'Quantity', FRACTION), truth)
+    assert rate >= 0.9
+
+
+def test_total_ci_covers_population_total(population):
+    rate = coverage(population, lambda s: sa.ht_total(s['Revenue'], FRACTION),
+                    population['Revenue'].sum())
+    assert rate >= 0.9
+
+
+def test_grouped_mean_ci_covers_group_means(population):
+    truth = population.groupby('Region', observed=True)['Revenue'].mean()
+    hits = 0
+    for seed in range(SEEDS):
+        keep = np.random.default_rng([seed, 1]).random(len(population)) < FRACTION
+        estimate, half_width = sa.sample_mean(population[keep], 'Revenue', FRACTION, by=['Region'])
+        hits += int(((estimate - truth).abs() <= half_width).sum())
+    assert hits / (SEEDS * len(truth)) >= 0.9
+
+
+def test_product_registers_hash_every_row(tmp_path):
+    products = [f'SKU{i:05d}' for i in range(3_000)]
+    pd.DataFrame({'Product': products * 2, 'Date': '2024-01-15'}).to_csv(tmp_path / 'sales.csv', index=False)
+    estimate, half_width = sa.hll_count(sa.product_registers(tmp_path / 'sales.csv', chunksize=1_000))
+    assert abs(estimate - 3_000) <= half_width
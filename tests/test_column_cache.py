@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+import pytest
+
+import salesanalysis as sa
+
+CSV = """Order_ID,Date,Product,Category,Region,Quantity,Unit_Price,Revenue,Customer_Segment,Sales_Channel
+ORD0000003,2024-01-15,Monitor,Computers,Europe,2,317.41,634.82,Individual,Online
+ORD0000001,2024-01-05,Mouse,Accessories,North America,3,24.51,73.53,Small Business,In-Store
+,2024-02-01,Écran,Computers,Asia Pacific,1,199.99,199.99,Enterprise,Partner
+ORD0000002,2024-02-03,Mouse,Accessories,Europe,4,24.51,98.04,Individual,Online
+"""
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'sales.csv'
+    path.write_text(CSV, encoding='utf-8')
+    return str(path)
+
+
+def test_reload_matches_fresh_parse(source, tmp_path):
+    parsed = sa.apply_sales_schema(pd.read_csv(source))
+    sa.write_column_cache(parsed, source, str(tmp_path / 'cache'))
+    cached = sa.read_column_cache(source, str(tmp_path / 'cache'))
+    # Numeric columns come back memory-mapped; compare values and dtypes
+    pd.testing.assert_frame_equal(cached.copy(), parsed)
+    assert list(cached['Product'].cat.categories) == sorted(cached['Product'].dropna().unique())
+
+
+def test_unique_text_columns_have_no_categories_file(source, tmp_path):
+    parsed = sa.apply_sales_schema(pd.read_csv(source))
+    sa.write_column_cache(parsed, source, str(tmp_path / 'cache'))
+    files = os.listdir(tmp_path / 'cache' / 'sales')
+    order_id = list(parsed.columns).index('Order_ID')
+    assert f'col{order_id}_categories.npy' not in files
+    assert f'col{order_id}_missing.npy' in files
+
+
+def test_changed_source_invalidates_cache(source, tmp_path):
+    parsed = sa.apply_sales_schema(pd.read_csv(source))
+    sa.write_column_cache(parsed, source, str(tmp_path / 'cache'))
+    with open(source, 'a', encoding='utf-8') as f:
+        f.write("ORD0000004,2024-02-04,Mouse,Accessories,Europe,1,24.51,24.51,Individual,Online\n")
+    assert sa.read_column_cache(source, str(tmp_path / 'cache')) is None
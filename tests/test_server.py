@@ -0,0 +1,70 @@
+import contextlib
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import HTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import salesanalysis as sa
+
+
+@pytest.fixture(scope='module')
+def cube():
+    rng = np.random.default_rng(7)
+    n = 2_000
+    quantity = rng.integers(1, 5, n)
+    unit_price = rng.uniform(5, 500, n).round(2)
+    df = pd.DataFrame({
+        'Order_ID': [f'ORD{i:07d}' for i in range(n)],
+        'Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'),
+        'Product': rng.choice([f'Product {i}' for i in range(30)], n),
+        'Category': rng.choice(['Computers', 'Accessories', 'Audio'], n),
+        'Region': rng.choice(['Europe', 'North America', 'Asia Pacific'], n),
+        'Quantity': quantity,
+        'Unit_Price': unit_price,
+        'Revenue': quantity * unit_price,
+        'Customer_Segment': rng.choice(['Individual', 'Enterprise'], n),
+        'Sales_Channel': rng.choice(['Online', 'In-Store'], n),
+    })
+    for column in sa.CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype('category')
+    with contextlib.redirect_stdout(io.StringIO()):
+        return sa.build_sales_cube(df)
+
+
+@pytest.mark.parametrize('n', ['-1', '0', '2.5', 'ten', str(sa.SERVER_MAX_TOP_N + 1)])
+def test_top_products_rejects_invalid_n(cube, n):
+    with pytest.raises(ValueError, match='^n must be'):
+        sa.query_report(cube, 'top-products', {'n': n})
+
+
+def test_top_products_returns_n_rows(cube):
+    assert len(sa.query_report(cube, 'top-products', {'n': '3'})['top_products']) == 3
+    by_region = sa.query_report(cube, 'top-products', {'n': '2', 'by': 'Region'})['top_products']
+    assert len(by_region) == 2 * cube['Region'].nunique()
+
+
+def test_top_products_rejects_grouping_by_product(cube):
+    with pytest.raises(ValueError, match='by Product itself'):
+        sa.query_report(cube, 'top-products', {'by': 'Product'})
+
+
+def test_invalid_parameters_answer_400(cube):
+    server = HTTPServer(('127.0.0.1', 0), sa.make_request_handler(cube))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        for query in ['n=-1', 'by=Product']:
+            url = f'http://127.0.0.1:{server.server_port}/top-products?{query}'
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(url)
+            assert error.value.code == 400
+            assert 'error' in json.loads(error.value.read())
+    finally:
+        server.shutdown()
+        server.server_close()